@@ -1,211 +1,243 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import scheduler
+import preprocess
+from jobs import JobManager, CANCELLED
+from cache import ResultCache, code_version
+import os
 import sys
 import time
 
 app = Flask(__name__)
 CORS(app)
 
-@app.route('/api/solve', methods=['POST'])
-def solve():
-    data = request.json
+# Longest search a request may ask for, in seconds. Under gunicorn it must stay below the
+# worker timeout: a search that holds the GIL also stops the worker's heartbeat
+MAX_TIME_LIMIT = float(os.environ.get('SOLVER_MAX_TIME_LIMIT', 300))
+
+# Responses of previous solves, keyed by their whole input and the code that solved them
+results = ResultCache(code_version(scheduler, preprocess, sys.modules[__name__]))
+
+def solve_payload(data, stop_flag=None, progress=None):
+    # Solves one /api/solve payload and returns (response body, HTTP status).
+    # stop_flag (a shared RawValue) lets a job cancel the search from another thread;
+    # progress(event) receives the scheduler's progress reports with their schedule.
     profesores = data.get('profesores', [])
     grupos = data.get('grupos', [])
     plan_de_estudios = data.get('planDeEstudios', [])
-    algorithm = data.get('algorithm', 'backtracking')
+    algorithm = data.get('algorithm', 'backtracking') # or 'greedy', 'local-search', 'lns', 'optimize', 'portfolio'
     time_limit = data.get('timeLimit', 300) # Default 5 minutes
+    ordering = data.get('ordering', 'static') # 'static' or 'mrv' (fail-first)
+    forward_checking = data.get('forwardChecking', False)
+    engine = data.get('engine', 'iterative') # 'iterative' (nogil) or 'recursive'
+    backjumping = data.get('backjumping', False) # conflict-directed backjumping + nogoods (iterative engine)
+    workers = data.get('workers') # portfolio processes (default: one per CPU core)
+    symmetry_breaking = data.get('symmetryBreaking', True) # skip permutations of interchangeable units and professors (backtracking)
+    decompose = data.get('decompose', True) # solve independent group/professor clusters in parallel processes
+    node_model = data.get('nodeModel', 'units') # 'units' (one node per hour) or 'blocks' (place 2-hour blocks first, split the ones that do not fit)
+    horarios_previos = data.get('horariosPrevios') # previous 'horarios' result to warm-start from (keeps its still-valid bloques)
+    phase_saving = data.get('phaseSaving', False) # try each node's value from the best partial schedule first, with restarts (iterative engine)
+    use_cache = data.get('useCache', True) # reuse (and store) the response of an identical payload
+    if isinstance(time_limit, bool) or not isinstance(time_limit, (int, float)):
+        return {'status': 'error', 'message': 'timeLimit debe ser un número de segundos'}, 400
+    time_limit = min(time_limit, MAX_TIME_LIMIT)
+    if ordering not in ('static', 'mrv'):
+        return {'status': 'error', 'message': 'ordering debe ser "static" o "mrv"'}, 400
+    if backjumping and (engine != 'iterative' or algorithm == 'optimize'):
+        return {'status': 'error', 'message': 'backjumping requiere el motor iterativo y no se admite con optimize'}, 400
+    if phase_saving and engine != 'iterative':
+        return {'status': 'error', 'message': 'phaseSaving requiere el motor iterativo'}, 400
+    if node_model not in ('units', 'blocks'):
+        return {'status': 'error', 'message': 'nodeModel debe ser "units" o "blocks"'}, 400
+
+    # Every input that decides the result, with the defaults filled in
+    cache_key = results.key({
+        'profesores': profesores, 'grupos': grupos, 'planDeEstudios': plan_de_estudios,
+        'algorithm': algorithm, 'timeLimit': float(time_limit), 'ordering': ordering,
+        'forwardChecking': forward_checking, 'engine': engine, 'backjumping': backjumping,
+        'workers': workers, 'symmetryBreaking': symmetry_breaking, 'decompose': decompose,
+        'nodeModel': node_model, 'horariosPrevios': horarios_previos, 'phaseSaving': phase_saving
+    })
+    if use_cache:
+        cached = results.get(cache_key)
+        if cached is not None:
+            return cached, 200
     
-    # Pre-process data to create "Nodes" (Units)
-    nodes_data = []
-    
-    # Helper to map slot IDs to indices
-    slot_map = {
-        's1': 0, 's2': 1, 's3': 2, 's4': 3,
-        's5': 4, 's6': 5, 's7': 6, 's8': 7, 's9': 8
-    }
-    day_map = {'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4}
-    days_list = ['mon', 'tue', 'wed', 'thu', 'fri']
-    
-    materia_global_idx = 0
+    # Pre-process data to create "Nodes" (Units): availability and competence
+    # tensors are built once and every unit's domain is derived from them with NumPy
+    nodes_data = preprocess.build_nodes(profesores, grupos, plan_de_estudios)
+    if horarios_previos:
+        preprocess.attach_previous(nodes_data, horarios_previos, profesores)
+    if node_model == 'blocks':
+        # A greedy pass over the blocks model places the 2-hour blocks, and the search
+        # warm-starts from them hour by hour: a block that does not fit is split
+        blocks = scheduler.run_scheduler(preprocess.build_nodes(profesores, grupos, plan_de_estudios, 'blocks'),
+                                         profesores, grupos, plan_de_estudios, 'greedy', time_limit, decompose=False)
+        preprocess.attach_blocks(nodes_data, blocks['assignments'], profesores)
     
-    for grupo in grupos:
-        materias = [m for m in plan_de_estudios if m['cuatrimestre'] == grupo['cuatrimestre']]
-        for materia in materias:
-            materia_global_idx += 1
-            
-            # 1. Day Rotation Strategy
-            # Rotate starting day based on materia index to distribute load
-            start_day_idx = materia_global_idx % 5
-            day_order = days_list[start_day_idx:] + days_list[:start_day_idx]
-            
-            for i in range(materia['horasSemana']):
-                # Calculate possible assignments for this unit
-                # (day_idx, slot_idx, prof_idx)
-                possible = []
-                
-                # Filter eligible professors
-                eligible_profs = [p for p in profesores if materia['id'] in p['competencias']]
-                
-                # 2. Professor Load Balancing (Static Round Robin)
-                # Rotate eligible professors to avoid always picking the first one
-                # This helps distribute the "first pick" advantage
-                if eligible_profs:
-                    prof_start_idx = (materia_global_idx + i) % len(eligible_profs)
-                    eligible_profs = eligible_profs[prof_start_idx:] + eligible_profs[:prof_start_idx]
-                
-                # We need to map back to original indices for the backend
-                # Create a list of (prof_obj, original_idx)
-                eligible_profs_with_idx = []
-                for p in eligible_profs:
-                     # Find original index efficiently? 
-                     # We can just iterate the main list or build a map. 
-                     # Since num_profs is small, index() is fine.
-                     eligible_profs_with_idx.append((p, profesores.index(p)))
-
-                # Generate assignments following the rotated day order
-                for day_id in day_order:
-                    day_idx = day_map[day_id]
-                    
-                    # Iterate slots (standard order s1-s9 is usually fine, but could also be rotated)
-                    for slot_id, slot_idx in sorted(slot_map.items(), key=lambda x: x[1]):
-                        
-                        # Check each professor
-                        for prof, p_idx in eligible_profs_with_idx:
-                            # Check availability
-                            if prof['disponibilidad'].get(day_id, {}).get(slot_id) == 'available':
-                                possible.append((day_idx, slot_idx, p_idx))
-                                
-                nodes_data.append({
-                    'id': f"{grupo['id']}-{materia['id']}-{i}",
-                    'grupoId': grupo['id'],
-                    'materiaId': materia['id'],
-                    'unitIndex': i,
-                    'possibleAssignments': possible
-                })
-
     try:
         start_time = time.time()
-        result = scheduler.run_scheduler(nodes_data, profesores, grupos, plan_de_estudios, algorithm, time_limit)
+        result = scheduler.run_scheduler(nodes_data, profesores, grupos, plan_de_estudios, algorithm, time_limit, ordering, forward_checking, engine, backjumping, workers, symmetry=symmetry_breaking, decompose=decompose, phase_saving=phase_saving, stop_flag=stop_flag, progress=progress, progress_schedule=progress is not None)
         end_time = time.time()
         
         duration_ms = int((end_time - start_time) * 1000)
         if duration_ms < 1:
             duration_ms = 0 # Or < 1 ms
         
-        # Format response to match frontend expected format
-        horarios = []
+        # Format response to match frontend expected format, in one pass over the
+        # assignments bucketed by group
+        bloques_by_group = {grupo['id']: [] for grupo in grupos}
         assignments = result['assignments']
         
-        for grupo in grupos:
-            bloques = []
-            grp_assignments = [a for a in assignments if a['grupoId'] == grupo['id']]
+        for a in assignments:
+            bloques = bloques_by_group.get(a['grupoId'])
+            if bloques is None:
+                continue
+            # Fix slot ID mapping (reverse of what we did in pyx)
+            # In pyx we just did s{i+1}, but we need to handle receso gap if we want to be precise
+            # For now let's trust the simple mapping s1..s9
             
-            for a in grp_assignments:
-                # Fix slot ID mapping (reverse of what we did in pyx)
-                # In pyx we just did s{i+1}, but we need to handle receso gap if we want to be precise
-                # For now let's trust the simple mapping s1..s9
-                
-                bloques.append({
-                    'id': a['id'],
-                    'grupoId': a['grupoId'],
-                    'materiaId': a['materiaId'],
-                    'profesorId': a['profesorId'],
-                    'dia': a['dia'],
-                    'slotId': a['slotId'],
-                    'duracion': 1,
-                    'huecoPrevio': False,
-                    'esContinuo': True
-                })
-
-            # Calculate Gaps for this group
-            # Group assignments by day
-            day_assignments = {}
-            for a in grp_assignments:
-                d = a['dia']
-                if d not in day_assignments: day_assignments[d] = []
-                day_assignments[d].append(slot_map[a['slotId']]) # Use numeric index
-            
-            total_gaps = 0
-            for d, slots_indices in day_assignments.items():
-                slots_indices.sort()
-                if not slots_indices: continue
-                
-                # Range from first class to last class
-                first_slot = slots_indices[0]
-                last_slot = slots_indices[-1]
-                
-                # Total span
-                span = last_slot - first_slot + 1
-                
-                # Actual classes
-                count = len(slots_indices)
-                
-                # Gaps = Span - Count
-                # Example: Class at 0, Class at 2. Span = 3 (0,1,2). Count = 2. Gaps = 1.
-                gaps = span - count
-                total_gaps += gaps
+            bloques.append({
+                'id': a['id'],
+                'grupoId': a['grupoId'],
+                'materiaId': a['materiaId'],
+                'profesorId': a['profesorId'],
+                'dia': a['dia'],
+                'slotId': a['slotId'],
+                'duracion': 1,
+                'huecoPrevio': False,
+                'esContinuo': True
+            })
+
+        horarios = []
+        for grupo in grupos:
+            # Soft metrics are maintained by the scheduler while it searches
+            metrics = result['metrics'].get(grupo['id'], {'huecos': 0, 'softScore': 10, 'diasCortos': []})
             
             horarios.append({
                 'grupoId': grupo['id'],
-                'bloques': bloques,
+                'bloques': bloques_by_group[grupo['id']],
                 'metricas': {
-                    'huecos': total_gaps,
+                    'huecos': metrics['huecos'],
                     'violacionesDuras': 0 if result['success'] else 1,
-                    'softScore': 10
+                    'softScore': metrics['softScore']
                 }
             })
 
         # Calculate Warnings
         warnings = []
+        # Names by id (the first entry wins, as a scan of the list would)
+        grupo_names = {}
+        for g in grupos:
+            grupo_names.setdefault(g['id'], g['nombre'])
+        materia_names = {}
+        for m in plan_de_estudios:
+            materia_names.setdefault(m['id'], m['nombre'])
         
         # 1. Unassigned Subjects
         assigned_ids = set(a['id'] for a in assignments)
         unassigned_count = 0
+        total_hours = sum(node['duracion'] for node in nodes_data)
         missing_summary = {}
         
         for node in nodes_data:
             if node['id'] not in assigned_ids:
-                unassigned_count += 1
-                key = f"{node['grupoId']}|{node['materiaId']}"
-                missing_summary[key] = missing_summary.get(key, 0) + 1
+                unassigned_count += node['duracion']
+                key = (node['grupoId'], node['materiaId'])
+                missing_summary[key] = missing_summary.get(key, 0) + node['duracion']
                 
-        for key, count in missing_summary.items():
-            grp_id, mat_id = key.split('|')
-            # Find names
-            grp_name = next((g['nombre'] for g in grupos if g['id'] == grp_id), grp_id)
-            mat_name = next((m['nombre'] for m in plan_de_estudios if m['id'] == mat_id), mat_id)
+        for (grp_id, mat_id), count in missing_summary.items():
+            grp_name = grupo_names.get(grp_id, grp_id)
+            mat_name = materia_names.get(mat_id, mat_id)
             warnings.append(f"No se pudieron asignar {count} horas de {mat_name} al grupo {grp_name}")
 
-        # 2. Min 6 Classes per Day (Warning)
+        # 2. Min 6 Classes per Day (Warning), from the scheduler's short-day tracking
+        day_names = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
         for grupo in grupos:
-            grp_assignments = [a for a in assignments if a['grupoId'] == grupo['id']]
-            by_day = {'mon': 0, 'tue': 0, 'wed': 0, 'thu': 0, 'fri': 0}
-            for a in grp_assignments:
-                if a['dia'] in by_day:
-                    by_day[a['dia']] += 1
-            
-            for day, count in by_day.items():
-                if 0 < count < 6:
-                    grp_name = grupo['nombre']
-                    day_name = {'mon': 'Lunes', 'tue': 'Martes', 'wed': 'Miércoles', 'thu': 'Jueves', 'fri': 'Viernes'}.get(day, day)
-                    warnings.append(f"El grupo {grp_name} tiene pocas clases ({count}) el {day_name} (mínimo recomendado: 6)")
+            for day_idx, count in result['metrics'].get(grupo['id'], {'diasCortos': []})['diasCortos']:
+                warnings.append(f"El grupo {grupo['nombre']} tiene pocas clases ({count}) el {day_names[day_idx]} (mínimo recomendado: 6)")
 
-        return jsonify({
+        body = {
             'status': 'ok' if result['success'] else 'infeasible',
             'horarios': horarios,
             'resumen': {
-                'mensaje': 'Generado con Cython Backend' if result['success'] else f"Incompleto ({len(assignments)}/{len(nodes_data)} asignados)",
+                'mensaje': 'Generado con Cython Backend' if result['success'] else f"Incompleto ({total_hours - unassigned_count}/{total_hours} horas asignadas)",
                 'tiempoMs': duration_ms, 
                 'violacionesDuras': len(warnings),
                 'huecosPromedio': round(sum(h['metricas']['huecos'] for h in horarios) / len(horarios), 2) if horarios else 0
             },
             'advertencias': warnings
-        })
+        }
+        # A cancelled job returns whatever it had found: not the answer to this payload
+        if use_cache and (stop_flag is None or stop_flag.value != CANCELLED):
+            results.put(cache_key, body)
+        return body, 200
         
     except Exception as e:
         print(e)
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        return {'status': 'error', 'message': str(e)}, 500
+
+@app.route('/api/solve', methods=['POST'])
+def solve():
+    body, status = solve_payload(request.json)
+    return jsonify(body), status
+
+# Asynchronous solves: submit returns a job id at once, then poll or cancel it
+jobs = JobManager(solve_payload)
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    job = jobs.submit(request.json)
+    return jsonify(job.to_dict()), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    # ?horario=1 keeps the 'asignaciones' of the latest progress event: the best schedule
+    # so far, which a client can show before deciding to cancel
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Trabajo no encontrado'}), 404
+    return jsonify(job.to_dict(request.args.get('horario') == '1'))
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    # Server-Sent Events: 'progress' while the job runs (?horario=1 adds the partial
+    # schedule every few seconds), then 'done' with the final job state
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Trabajo no encontrado'}), 404
+    stream = jobs.events(job, request.args.get('horario') == '1')
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    # The search stops at its next time check; poll the job for its partial result (or
+    # GET it with ?horario=1 first to see the schedule it is about to stop at)
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Trabajo no encontrado'}), 404
+    return jsonify(job.to_dict()), 202
+
+# Hit/miss counters of the result cache
+@app.route('/api/cache', methods=['GET'])
+def cache_stats():
+    return jsonify(results.stats())
+
+@app.route('/api/cache', methods=['DELETE'])
+def clear_cache():
+    results.clear()
+    return jsonify(results.stats())
+
+def warm_up():
+    # One tiny solve, so NumPy, the compiled scheduler and the preprocessing are loaded and
+    # initialised before the server takes traffic (gunicorn.conf.py runs it before forking)
+    profesores = [{'id': 'warm-up', 'maxHoras': 1, 'competencias': ['warm-up'],
+                   'disponibilidad': {'mon': {'s1': 'available'}}}]
+    grupos = [{'id': 'warm-up', 'nombre': 'warm-up', 'cuatrimestre': 1}]
+    plan_de_estudios = [{'id': 'warm-up', 'nombre': 'warm-up', 'horasSemana': 1, 'cuatrimestre': 1}]
+    nodes_data = preprocess.build_nodes(profesores, grupos, plan_de_estudios)
+    scheduler.run_scheduler(nodes_data, profesores, grupos, plan_de_estudios, time_limit=1, decompose=False)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
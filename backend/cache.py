@@ -0,0 +1,168 @@
+"""Content-addressed cache of /api/solve responses.
+
+The key is a SHA-256 of the canonical JSON of everything that decides the result: the
+professors, groups and study plan (in their given order, which the solver depends on)
+and every solver option with its default filled in, plus the version of the code that
+produced the response, so a new scheduler build or response format never reads the
+entries of an older one. Responses live in an in-memory LRU
+and, if SOLVER_CACHE_DIR is set, in one JSON file per key that survives restarts and is
+shared by the server's worker processes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Responses kept in memory, and on disk if a directory is configured
+CACHE_SIZE = int(os.environ.get('SOLVER_CACHE_SIZE', 64))
+CACHE_DISK_SIZE = int(os.environ.get('SOLVER_CACHE_DISK_SIZE', 1024))
+CACHE_DIR = os.environ.get('SOLVER_CACHE_DIR')
+# Seconds a response stays valid
+CACHE_TTL = float(os.environ.get('SOLVER_CACHE_TTL', 24 * 3600))
+# Bump when the cached response format changes without any module file changing
+CACHE_VERSION = 1
+
+
+def code_version(*modules):
+    # Hash of the modules' files (e.g. the compiled scheduler and app.py) and CACHE_VERSION
+    digest = hashlib.sha256(str(CACHE_VERSION).encode())
+    for module in modules:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def payload_key(payload, version=''):
+    # Keys are sorted so the same payload always gives the same text; lists keep their order
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(f"{version}:{canonical}".encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, version='', max_entries=CACHE_SIZE, ttl=CACHE_TTL, directory=CACHE_DIR, max_disk_entries=CACHE_DISK_SIZE):
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # key -> (stored_at, body), least recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, payload):
+        return payload_key(payload, self.version)
+
+    def get(self, key):
+        # Returns the cached body, or None
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        entry = self.read_disk(key, now)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self.remember(key, entry)
+        return entry[1]
+
+    def put(self, key, body):
+        entry = (time.time(), body)
+        with self.lock:
+            self.remember(key, entry)
+        self.write_disk(key, entry)
+
+    def remember(self, key, entry):
+        # Caller holds the lock
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def read_disk(self, key, now):
+        if not self.directory:
+            return None
+        try:
+            with open(self.path(key), encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if now - stored['storedAt'] > self.ttl:
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+            return None
+        return stored['storedAt'], stored['body']
+
+    def write_disk(self, key, entry):
+        if not self.directory:
+            return
+        # Written under a temporary name and renamed, so readers never see half a file
+        tmp = f"{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'storedAt': entry[0], 'body': entry[1]}, f, ensure_ascii=False)
+            os.replace(tmp, self.path(key))
+            self.prune_disk()
+        except OSError as e:
+            print(f"Result cache: could not write {key}: {e}")
+
+    def prune_disk(self):
+        # Drops the oldest files beyond max_disk_entries
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for name in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(name)
+                with self.lock:
+                    self.evictions += 1
+            except OSError:
+                pass
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entradas': len(self.entries),
+                'aciertos': self.hits,
+                'aciertosDisco': self.disk_hits,
+                'fallos': self.misses,
+                'desalojos': self.evictions,
+                'tasaAciertos': round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                'disco': self.directory,
+                'version': self.version
+            }
@@ -0,0 +1,44 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py app:app (from backend/).
+
+Every setting can be overridden with an environment variable. The app is imported and
+warmed up once in the master process, then forked into the workers.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import time
+
+bind = os.environ.get('SOLVER_BIND', '0.0.0.0:5000')
+# Worker processes, each answering requests with its own threads (event streams and
+# synchronous solves hold one thread for their whole duration)
+workers = int(os.environ.get('SOLVER_WEB_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('SOLVER_WEB_THREADS', 8))
+# With gthread workers this is only the heartbeat timeout: the master kills a worker whose
+# main loop has not reported for that long, and requests themselves are never timed out.
+# A search that holds the GIL (the recursive engine, greedy, local search) blocks the
+# heartbeat until it ends, so the timeout must outlast the longest search the app allows
+# (timeLimit is capped at SOLVER_MAX_TIME_LIMIT) plus preprocessing and response assembly
+max_time_limit = float(os.environ.get('SOLVER_MAX_TIME_LIMIT', 300))
+timeout = int(os.environ.get('SOLVER_REQUEST_TIMEOUT', max_time_limit + 60))
+graceful_timeout = int(os.environ.get('SOLVER_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+preload_app = True
+
+# Jobs live in the worker that received them: share their state between the workers.
+# The default directory is named after this checkout and the bind address, so two
+# deployments on the same host never read or cancel each other's jobs
+if workers > 1:
+    deployment = hashlib.sha256(f"{os.path.dirname(os.path.abspath(__file__))}|{bind}".encode()).hexdigest()[:12]
+    os.environ.setdefault('SOLVER_JOBS_DIR', os.path.join(tempfile.gettempdir(), f'solver-jobs-{deployment}'))
+
+
+def when_ready(server):
+    # The app is preloaded and no worker exists yet
+    import app
+    start = time.monotonic()
+    app.warm_up()
+    server.log.info("Solver warmed up in %.2fs; starting %d workers", time.monotonic() - start, workers)
@@ -0,0 +1,297 @@
+"""Asynchronous /api/solve jobs.
+
+A job runs the same solve as POST /api/solve in a bounded thread pool, so the request
+that submits it returns at once and several solves can run side by side. Cancelling a
+job raises its stop flag, which the scheduler polls in every time check: the search
+stops and the job keeps the best schedule found so far, as on a time limit.
+
+While a job runs, the scheduler's progress lines arrive as events (assigned nodes,
+elapsed time, explored nodes, cost and the schedule they describe), which clients can
+poll or follow as a Server-Sent Events stream.
+
+Under a multi-process server (gunicorn) each job lives in the worker that received it.
+With SOLVER_JOBS_DIR set, its state is mirrored to a file there so any worker can answer
+a poll or stream for it, and a cancellation that reaches another worker is left as a
+marker file that the owner picks up.
+"""
+
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Solves running at the same time; later jobs wait in the pool's queue
+MAX_JOBS = int(os.environ.get('SOLVER_MAX_JOBS', 2))
+# Seconds a finished job stays available for polling
+JOB_TTL = 3600
+# Stop flag value of a cancelled job. The scheduler stops on any non-zero value; a
+# portfolio raises the same flag with 1 when one of its workers completes the schedule
+CANCELLED = 2
+# Event streams: minimum seconds between two partial schedules, and between keep-alive
+# comments when nothing happens (so proxies do not close an idle stream)
+SCHEDULE_INTERVAL = 5.0
+KEEPALIVE_INTERVAL = 15.0
+# Directory shared by the server's processes, and seconds between two looks at it
+JOBS_DIR = os.environ.get('SOLVER_JOBS_DIR')
+SHARED_POLL_INTERVAL = 0.5
+
+
+class Job:
+    def __init__(self, payload):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.status = 'queued'  # 'running', then 'done', 'cancelled' or 'error'
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = False
+        # Last progress event of the scheduler; version grows with every event or status change
+        self.progress = None
+        self.version = 0
+        # Shared memory, so the component and portfolio worker processes can read it too
+        self.stop_flag = multiprocessing.get_context('spawn').RawValue('i', 0)
+        self.future = None
+
+    def to_dict(self, with_schedule=False):
+        # The progress event keeps its 'asignaciones' only if with_schedule
+        elapsed = 0
+        if self.started is not None:
+            elapsed = int(((self.finished or time.time()) - self.started) * 1000)
+        return {
+            'jobId': self.id,
+            'status': self.status,
+            'tiempoMs': elapsed,
+            'progreso': None if self.progress is None else {k: v for k, v in self.progress.items()
+                                                            if with_schedule or k != 'asignaciones'},
+            'resultado': self.result
+        }
+
+
+class SharedJob(Job):
+    """Read-only copy of a job owned by another process, loaded from its state file."""
+
+    def __init__(self, state):
+        self.id = state['jobId']
+        self.status = state['status']
+        self.result = state['resultado']
+        self.started = state['started']
+        self.finished = state['finished']
+        self.progress = state['progreso']
+        self.version = state['version']
+
+
+class JobManager:
+    """Queues solves in a thread pool of max_workers threads.
+
+    solve(payload, stop_flag, progress) returns (body, http_status) like the /api/solve
+    handler, calling progress(event) while it searches.
+    The iterative engine releases the GIL while searching and the component and portfolio
+    modes search in worker processes, so running jobs do not serialize on the GIL.
+    """
+
+    def __init__(self, solve, max_workers=MAX_JOBS, ttl=JOB_TTL, directory=JOBS_DIR):
+        self.solve = solve
+        self.ttl = ttl
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Threads start on the first submit: a server that preloads the app and then forks
+        # its workers must not have started any yet
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='solver')
+        self.watcher = None
+        self.jobs = {}
+        self.lock = threading.Lock()
+        # Wakes the event streams when a job reports progress or changes status
+        self.changed = threading.Condition(self.lock)
+
+    def submit(self, payload):
+        job = Job(payload)
+        with self.lock:
+            self.purge()
+            self.jobs[job.id] = job
+            self.publish(job)
+            job.future = self.pool.submit(self.run, job)
+            if self.directory and self.watcher is None:
+                self.watcher = threading.Thread(target=self.watch_cancellations, name='solver-cancel', daemon=True)
+                self.watcher.start()
+        return job
+
+    def get(self, job_id):
+        # The job, a SharedJob if another process owns it, or None
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            job = self.read_shared(job_id)
+        return job
+
+    def cancel(self, job_id):
+        # Returns the job, or None if it does not exist
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                shared = self.read_shared(job_id)
+                if shared is not None and shared.finished is None:
+                    # Left for the owner's watch_cancellations
+                    open(self.shared_path(job_id, '.cancel'), 'w').close()
+                return shared
+            if job.finished is not None:
+                return job
+            job.cancel_requested = True
+            job.stop_flag.value = CANCELLED
+            if job.future.cancel():
+                # Still queued: it never starts
+                self.finish(job, 'cancelled')
+            return job
+
+    def run(self, job):
+        with self.lock:
+            if job.cancel_requested:
+                # Cancelled between leaving the queue and starting
+                self.finish(job, 'cancelled')
+                return
+            job.status = 'running'
+            job.started = time.time()
+            self.notify(job)
+        try:
+            body, http_status = self.solve(job.payload, job.stop_flag, lambda event: self.report(job, event))
+        except Exception as e:
+            body, http_status = {'status': 'error', 'message': str(e)}, 500
+        with self.lock:
+            job.result = body
+            job.payload = None
+            if http_status != 200:
+                self.finish(job, 'error')
+            else:
+                # A portfolio raises the flag itself when a worker finishes first
+                self.finish(job, 'cancelled' if job.cancel_requested else 'done')
+
+    def finish(self, job, status):
+        # Caller holds the lock
+        job.status = status
+        job.finished = time.time()
+        self.notify(job)
+
+    def report(self, job, event):
+        # Progress callback of a running job's scheduler
+        with self.lock:
+            job.progress = event
+            self.notify(job)
+
+    def notify(self, job):
+        # A job changed: wake its event streams and mirror it (caller holds the lock)
+        job.version += 1
+        self.changed.notify_all()
+        self.publish(job)
+
+    def wait_change(self, job, version, timeout):
+        # Waits up to timeout seconds for a version of the job other than version.
+        # Returns the job as it is then (re-read from its file if another process owns it)
+        if not isinstance(job, SharedJob):
+            with self.lock:
+                self.changed.wait_for(lambda: job.version != version, timeout)
+                return job
+        deadline = time.time() + timeout
+        while True:
+            job = self.read_shared(job.id) or job
+            if job.version != version or time.time() >= deadline:
+                return job
+            time.sleep(SHARED_POLL_INTERVAL)
+
+    def events(self, job, with_schedule=False):
+        """Yields the job's Server-Sent Events: a 'progress' event per scheduler report
+        (with its 'asignaciones' at most every SCHEDULE_INTERVAL seconds if with_schedule),
+        then one 'done' event with the final job state."""
+        version = -1
+        last_schedule = 0.0
+        while True:
+            job = self.wait_change(job, version, KEEPALIVE_INTERVAL)
+            with self.lock:
+                changed = job.version != version
+                version = job.version
+                event = job.progress
+                state = job.to_dict() if job.finished is not None else None
+            if state is not None:
+                yield f"event: done\ndata: {json.dumps(state)}\n\n"
+                return
+            if not changed:
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                # Started, no progress reported yet
+                continue
+            data = {k: v for k, v in event.items() if k != 'asignaciones'}
+            now = time.time()
+            if with_schedule and event.get('asignaciones') and now - last_schedule >= SCHEDULE_INTERVAL:
+                last_schedule = now
+                data['asignaciones'] = event['asignaciones']
+            yield f"event: progress\ndata: {json.dumps(data)}\n\n"
+
+    def purge(self):
+        # Drops the jobs finished more than ttl seconds ago (caller holds the lock), and the
+        # shared files nobody updated for as long (e.g. of a worker that was restarted)
+        now = time.time()
+        for job_id in [j.id for j in self.jobs.values() if j.finished is not None and now - j.finished > self.ttl]:
+            del self.jobs[job_id]
+        if self.directory:
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    if now - os.path.getmtime(path) > self.ttl:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def shared_path(self, job_id, suffix='.json'):
+        return os.path.join(self.directory, job_id + suffix)
+
+    def publish(self, job):
+        # Writes the job's state file (caller holds the lock); renamed into place so
+        # readers never see half a file
+        if not self.directory:
+            return
+        state = {
+            'jobId': job.id,
+            'status': job.status,
+            'resultado': job.result,
+            'started': job.started,
+            'finished': job.finished,
+            'progreso': job.progress,
+            'version': job.version
+        }
+        tmp = self.shared_path(job.id, f'.{os.getpid()}.tmp')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp, self.shared_path(job.id))
+        except OSError as e:
+            print(f"Jobs: could not write the state of {job.id}: {e}")
+
+    def read_shared(self, job_id):
+        # The job's state file as a SharedJob, or None
+        if not self.directory or not re.fullmatch(r'[0-9a-f]{32}', job_id):
+            return None
+        try:
+            with open(self.shared_path(job_id), encoding='utf-8') as f:
+                return SharedJob(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def watch_cancellations(self):
+        # Cancels this process's jobs for which another process left a marker
+        while True:
+            time.sleep(SHARED_POLL_INTERVAL)
+            with self.lock:
+                pending = [job_id for job_id, job in self.jobs.items() if job.finished is None]
+            for job_id in pending:
+                marker = self.shared_path(job_id, '.cancel')
+                if os.path.exists(marker):
+                    self.cancel(job_id)
+                    try:
+                        os.remove(marker)
+                    except OSError:
+                        pass
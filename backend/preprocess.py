@@ -0,0 +1,177 @@
+"""Builds the scheduler's nodes and candidate domains from a /api/solve payload.
+
+The availability tensor and the competence matrix are built once per request and
+every domain is derived from them with NumPy, so the cost grows with the number
+of subjects instead of units x professors x slots.
+"""
+
+import numpy as np
+
+SLOT_IDS = ['s1', 's2', 's3', 's4', 's5', 's6', 's7', 's8', 's9']
+DAY_IDS = ['mon', 'tue', 'wed', 'thu', 'fri']
+
+
+def availability_tensor(profesores):
+    # [prof_idx, day_idx, slot_idx] -> True if the professor is available in that slot.
+    # The only per-slot Python work: every domain below is derived from it with NumPy.
+    return np.array([[[prof['disponibilidad'].get(day_id, {}).get(slot_id) == 'available'
+                       for slot_id in SLOT_IDS]
+                      for day_id in DAY_IDS]
+                     for prof in profesores], dtype=bool).reshape(len(profesores), len(DAY_IDS), len(SLOT_IDS))
+
+
+def competence_matrix(profesores, plan_de_estudios):
+    # Returns (competence, materia_col): competence[prof_idx, materia_col[materia_id]] is
+    # True if the professor can teach the subject
+    materia_col = {}
+    for materia in plan_de_estudios:
+        materia_col.setdefault(materia['id'], len(materia_col))
+    competence = np.zeros((len(profesores), len(materia_col)), dtype=bool)
+    for p_idx, prof in enumerate(profesores):
+        competence[p_idx, [materia_col[m] for m in prof['competencias'] if m in materia_col]] = True
+    return competence, materia_col
+
+
+def start_tensor(available, duracion):
+    # [prof_idx, day_idx, slot_idx] -> True if a node of duracion hours can start there
+    # with the professor available for every hour
+    num_starts = available.shape[2] - duracion + 1
+    starts = available[:, :, :num_starts].copy()
+    for h in range(1, duracion):
+        starts &= available[:, :, h:h + num_starts]
+    return starts
+
+
+def candidate_rows(eligible, rotations, starts):
+    # Rows of one subject for every (day rotation, professor rotation) pair in one pass.
+    # Each node's (day_idx, slot_idx, p_idx) rows follow the search order: days as rotated,
+    # slots in order, professors as rotated. nonzero() walks the gathered
+    # [rotation, day, slot, prof] tensor in C order, which is exactly that order.
+    num_days, num_starts = starts.shape[1], starts.shape[2]
+    rotations = np.asarray(rotations)
+    if len(eligible) == 0:
+        return [np.zeros((0, 3), dtype=np.int32) for _ in rotations]
+    day_order = (np.arange(num_days) + rotations[:, :1]) % num_days
+    prof_order = eligible[(np.arange(len(eligible)) + rotations[:, 1:]) % len(eligible)]
+    available = starts[prof_order[:, None, None, :], day_order[:, :, None, None],
+                       np.arange(num_starts)[None, None, :, None]]
+    k, day_pos, slot_idx, prof_pos = np.nonzero(available)
+    rows = np.column_stack((day_order[k, day_pos], slot_idx, prof_order[k, prof_pos])).astype(np.int32)
+    bounds = np.searchsorted(k, np.arange(len(rotations) + 1))
+    return [rows[bounds[j]:bounds[j + 1]] for j in range(len(rotations))]
+
+
+def build_nodes(profesores, grupos, plan_de_estudios, node_model='units'):
+    """Returns the nodes_data list expected by scheduler.run_scheduler.
+
+    node_model is 'units' (one node per weekly hour) or 'blocks' (2-hour blocks,
+    plus a single hour when the weekly hours are odd). possibleAssignments are
+    (n, 3) int32 arrays, which pack_domains concatenates without iterating them.
+    """
+    available = availability_tensor(profesores)
+    competence, materia_col = competence_matrix(profesores, plan_de_estudios)
+    num_eligible = competence.sum(axis=0).tolist()
+    plan_by_cuatrimestre = {}
+    for materia in plan_de_estudios:
+        plan_by_cuatrimestre.setdefault(materia['cuatrimestre'], []).append(materia)
+
+    # Units only differ in their day and professor rotations (and their length), so
+    # rows are computed once per distinct (rotations, length) of each subject
+    rotations = {}
+    nodes_data = []
+    node_rotation = []
+    materia_global_idx = 0
+
+    for grupo in grupos:
+        for materia in plan_by_cuatrimestre.get(grupo['cuatrimestre'], []):
+            materia_global_idx += 1
+
+            # 1. Day Rotation Strategy
+            # Rotate starting day based on materia index to distribute load
+            start_day_idx = materia_global_idx % len(DAY_IDS)
+
+            eligible_count = num_eligible[materia_col[materia['id']]]
+
+            # Hours covered by each node: one per unit, or 2-hour blocks plus a single
+            # hour when the weekly hours are odd
+            if node_model == 'blocks':
+                durations = [2] * (materia['horasSemana'] // 2) + [1] * (materia['horasSemana'] % 2)
+            else:
+                durations = [1] * materia['horasSemana']
+            first_unit = 0
+
+            for i, duracion in enumerate(durations):
+                # 2. Professor Load Balancing (Static Round Robin)
+                # Rotate eligible professors to avoid always picking the first one
+                prof_start_idx = (materia_global_idx + i) % eligible_count if eligible_count else 0
+                pairs = rotations.setdefault((materia['id'], duracion), {})
+                node_rotation.append(pairs.setdefault((start_day_idx, prof_start_idx), len(pairs)))
+
+                nodes_data.append({
+                    'id': f"{grupo['id']}-{materia['id']}-{first_unit}",
+                    'grupoId': grupo['id'],
+                    'materiaId': materia['id'],
+                    'unitIndex': i,
+                    'duracion': duracion
+                })
+                first_unit += duracion
+
+    # Vectorized pass: one gather per (subject, length) for all its rotations
+    starts = {}
+    rows = {}
+    for (materia_id, duracion), pairs in rotations.items():
+        if duracion not in starts:
+            starts[duracion] = start_tensor(available, duracion)
+        eligible = np.flatnonzero(competence[:, materia_col[materia_id]])
+        rows[materia_id, duracion] = candidate_rows(eligible, list(pairs), starts[duracion])
+    for node, j in zip(nodes_data, node_rotation):
+        node['possibleAssignments'] = rows[node['materiaId'], node['duracion']][j]
+
+    return nodes_data
+
+
+def attach_previous(nodes_data, horarios_previos, profesores):
+    """Adds previousAssignment (day_idx, slot_idx, p_idx) to the nodes placed in a previous
+    /api/solve response, for the scheduler to warm-start from.
+
+    Bloques are matched by id. A node of several hours needs all of them, on one day, with
+    one professor and in consecutive slots.
+    """
+    prof_index = {prof['id']: p_idx for p_idx, prof in enumerate(profesores)}
+    bloques = {b['id']: b for horario in horarios_previos for b in horario.get('bloques', [])}
+    for node in nodes_data:
+        id_prefix, first_unit = node['id'].rsplit('-', 1)
+        hours = [bloques.get(f"{id_prefix}-{int(first_unit) + h}") for h in range(node['duracion'])]
+        if None in hours:
+            continue
+        first = hours[0]
+        if first['dia'] not in DAY_IDS or first['slotId'] not in SLOT_IDS or first['profesorId'] not in prof_index:
+            continue
+        slot_idx = SLOT_IDS.index(first['slotId'])
+        if slot_idx + node['duracion'] > len(SLOT_IDS):
+            continue
+        if all(b['dia'] == first['dia'] and b['profesorId'] == first['profesorId']
+               and b['slotId'] == SLOT_IDS[slot_idx + h] for h, b in enumerate(hours)):
+            node['previousAssignment'] = (DAY_IDS.index(first['dia']), slot_idx, prof_index[first['profesorId']])
+
+
+def attach_blocks(nodes_data, block_assignments, profesores):
+    """Adds previousAssignment to the unit nodes of every 2-hour block placed in the blocks
+    model, so the search starts from the blocks and only splits the ones that do not fit.
+
+    A block is skipped if either of its hours already has a previousAssignment (from
+    horariosPrevios, which wins).
+    """
+    prof_index = {prof['id']: p_idx for p_idx, prof in enumerate(profesores)}
+    units = {node['id']: node for node in nodes_data}
+    for a in block_assignments:
+        if a['duracion'] < 2:
+            continue
+        id_prefix, first_unit = a['id'].rsplit('-', 1)
+        hours = [units.get(f"{id_prefix}-{int(first_unit) + h}") for h in range(a['duracion'])]
+        if any(node is None or 'previousAssignment' in node for node in hours):
+            continue
+        day_idx = DAY_IDS.index(a['dia'])
+        slot_idx = SLOT_IDS.index(a['slotId'])
+        for h, node in enumerate(hours):
+            node['previousAssignment'] = (day_idx, slot_idx + h, prof_index[a['profesorId']])
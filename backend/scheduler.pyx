@@ -1,29 +1,134 @@
-# cython: language_level=3
+# cython: language_level=3, boundscheck=False, wraparound=False
 import cython
 from libc.stdlib cimport malloc, free
+from libc.stdint cimport uintptr_t
+from libc.math cimport exp, pow
+from posix.time cimport clock_gettime, timespec, CLOCK_MONOTONIC
 import numpy as np
 cimport numpy as np
 import time
+import os
+import ctypes
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import chain
+from queue import Empty
 
 # Define types for better performance
 ctypedef np.int32_t INT32_t
+ctypedef np.uint64_t UINT64_t
+
+# Minimum seconds between two "New best solution" progress lines
+cdef double PROGRESS_INTERVAL = 1.0
+
+# Learned nogoods: longer conflict sets are not stored, and a store that reaches
+# NOGOOD_CAPACITY literals is emptied (every nogood is forgotten) before the next one
+cdef int NOGOOD_MAX_SIZE = 24
+cdef int NOGOOD_CAPACITY = 1 << 16
+
+# Local search: cost of one unassigned hour in gap units, annealing temperatures
+# (start / end of the time budget) and how many iterations a moved node is protected
+cdef int LS_UNASSIGNED_WEIGHT = 100
+# Cost, also in gap units, of each warm-started node that local search or LNS moves off
+# its previous value
+cdef int LS_MOVED_WEIGHT = 5
+cdef double LS_START_TEMPERATURE = 2.0
+cdef double LS_END_TEMPERATURE = 0.05
+cdef int LS_TABU_TENURE = 50
+
+# Large neighbourhood search: seconds of backtracking allowed to repair each neighbourhood
+cdef double LNS_ITERATION_TIME = 0.1
+# Dead ends before the first restart with phase saving (grows by half each restart)
+cdef long long RESTART_FIRST_LIMIT = 100
+# Time for each warm-start round that searches only around the kept assignments (seconds)
+cdef double WARM_ROUND_TIME = 1.0
+
+# Soft objective: days with classes but fewer than MIN_DAY_CLASSES are short days, and a
+# group's softScore is SOFT_SCORE_MAX minus one point per gap and per short day (floor 0)
+cdef int MIN_DAY_CLASSES = 6
+cdef int SOFT_SCORE_MAX = 10
+
+cdef inline double monotonic_time() noexcept nogil:
+    # Wall-clock seconds that never jump backwards; safe to call without the GIL
+    cdef timespec ts
+    clock_gettime(CLOCK_MONOTONIC, &ts)
+    return ts.tv_sec + ts.tv_nsec * 1e-9
+
+cdef inline int popcount(unsigned int x) noexcept nogil:
+    # Number of set bits (SWAR)
+    x = x - ((x >> 1) & 0x55555555)
+    x = (x & 0x33333333) + ((x >> 2) & 0x33333333)
+    x = (x + (x >> 4)) & 0x0F0F0F0F
+    return <int>((x * 0x01010101) >> 24)
+
+cdef inline unsigned int day_span(unsigned int mask) noexcept nogil:
+    # Every slot from the first to the last busy slot
+    cdef unsigned int low = mask & (~mask + 1)
+    cdef unsigned int span = mask
+    span |= span >> 1
+    span |= span >> 2
+    span |= span >> 4
+    span |= span >> 8
+    span |= span >> 16
+    return span & ~(low - 1)
+
+cdef inline bint has_long_gap(unsigned int mask) noexcept nogil:
+    # True if two consecutive free slots lie between the first and last busy slot
+    cdef unsigned int holes = day_span(mask) & ~mask
+    return (holes & (holes >> 1)) != 0
+
+cdef inline int day_gaps(unsigned int mask) noexcept nogil:
+    # Free slots between the first and last busy slot (the huecos reported by app.py)
+    return popcount(day_span(mask)) - popcount(mask)
+
+cdef inline int short_day(unsigned int mask) noexcept nogil:
+    return 0 < popcount(mask) < MIN_DAY_CLASSES
+
+cdef inline int highest_bit(UINT64_t x) noexcept nogil:
+    # Index of the most significant set bit (x must be non-zero)
+    cdef int n = 0
+    if x >> 32:
+        x >>= 32
+        n += 32
+    if x >> 16:
+        x >>= 16
+        n += 16
+    if x >> 8:
+        x >>= 8
+        n += 8
+    if x >> 4:
+        x >>= 4
+        n += 4
+    if x >> 2:
+        x >>= 2
+        n += 2
+    if x >> 1:
+        n += 1
+    return n
 
 cdef class Node:
     cdef public str id
     cdef public str grupo_id
     cdef public str materia_id
     cdef public int unit_index
-    cdef public list possible_assignments # List of tuples (day_idx, slot_idx, prof_idx)
+    # Consecutive hours taken by the node (1, or 2 for a block); slot_idx is the first one
+    cdef public int length
+    # Candidate (day_idx, slot_idx, prof_idx) rows live in the scheduler's packed
+    # `values` array: values[value_start:value_end]
+    cdef public int value_start
+    cdef public int value_end
     cdef public int assigned_day
     cdef public int assigned_slot
     cdef public int assigned_prof
 
-    def __init__(self, id, grupo_id, materia_id, unit_index):
+    def __init__(self, id, grupo_id, materia_id, unit_index, length=1):
         self.id = id
         self.grupo_id = grupo_id
         self.materia_id = materia_id
         self.unit_index = unit_index
-        self.possible_assignments = []
+        self.length = length
+        self.value_start = 0
+        self.value_end = 0
         self.assigned_day = -1
         self.assigned_slot = -1
         self.assigned_prof = -1
@@ -31,19 +136,23 @@ cdef class Node:
 cdef class GraphScheduler:
     cdef list nodes
     cdef dict nodes_by_id
+    cdef int num_nodes
     cdef int num_days
     cdef int num_slots
     cdef int num_profs
     
     # State matrices for O(1) checks
-    # [prof_idx][day][slot] -> 1 if busy, 0 free
-    cdef int[:, :, :] prof_schedule 
-    # [group_idx][day][slot] -> 1 if busy, 0 free
-    cdef int[:, :, :] group_schedule
+    # [prof_idx][day] -> bitmask of busy slots (bit s set if busy in slot s)
+    cdef int[:, :] prof_schedule
+    # [group_idx][day] -> bitmask of busy slots
+    cdef int[:, :] group_schedule
     # [prof_idx] -> current load
     cdef int[:] prof_load
     # [prof_idx] -> max load
     cdef int[:] prof_max_load
+    # [prof_idx / group_idx][day][slot] -> node occupying that slot (only meaningful while the bit is set)
+    cdef int[:, :, :] prof_owner
+    cdef int[:, :, :] group_owner
     
     # Mappings
     cdef dict group_to_idx
@@ -58,6 +167,13 @@ cdef class GraphScheduler:
     # [group_idx][materia_idx][day] -> bitmask of slots
     cdef int[:, :, :] group_materia_day_slots
 
+    # Soft objective terms, kept up to date by apply_move / undo_move
+    # [group_idx] -> gaps over the week / days with fewer than MIN_DAY_CLASSES classes
+    cdef int[:] group_gaps
+    cdef int[:] group_short_days
+    cdef int total_gaps
+    cdef int total_short_days
+
     # Professor Consistency
     # [group_idx][materia_idx] -> prof_idx (or -1)
     cdef int[:, :] prof_assignment
@@ -70,9 +186,135 @@ cdef class GraphScheduler:
     # [prof_idx][group_idx] -> count of assignments for this subject
     cdef int[:, :] prof_group_subject_count
 
-    # Best Partial Solution
+    # Node indices (avoid dict lookups in the search)
+    # [node_idx] -> group_idx / materia_idx
+    cdef int[:] node_group
+    cdef int[:] node_materia
+    # [node_idx] -> assigned value row (-1 if unassigned); copied to the Node objects after solving
+    cdef int[:] node_value
+    # [node_idx] -> search depth of its current assignment
+    cdef int[:] node_depth
+
+    # Packed candidate domains
+    # values[value_start[i]:value_start[i + 1]] -> (day_idx, slot_idx, prof_idx) rows of node i
+    cdef int[:, :] values
+    cdef int[:] value_start
+    # [node_idx] -> hours of the node; [value row] -> bitmask of the slots it occupies
+    cdef int[:] node_length
+    cdef int[:] value_mask
+
+    # Interaction graph for variable ordering (CSR layout)
+    # group_nodes[group_nodes_start[g]:group_nodes_start[g + 1]] -> nodes of group g
+    cdef int[:] group_nodes_start
+    cdef int[:] group_nodes
+    # prof_nodes[prof_nodes_start[p]:prof_nodes_start[p + 1]] -> nodes that can take prof p
+    cdef int[:] prof_nodes_start
+    cdef int[:] prof_nodes
+    # [node_idx] -> number of other nodes sharing its group or a candidate professor
+    cdef int[:] node_degree
+
+    # MRV ordering
+    cdef bint use_mrv
+    # Unassigned searched nodes bucketed by live domain size, as doubly linked lists kept up
+    # to date by remove_value / restore_domains, so a decision only scans the smallest
+    # non-empty bucket. bucket_of[node_idx] is its bucket, or -1 while assigned or unused.
+    cdef int[:] bucket_head
+    cdef int[:] bucket_next
+    cdef int[:] bucket_prev
+    cdef int[:] bucket_of
+    # Lower bound of the smallest non-empty bucket
+    cdef int bucket_min
+    # [node_idx] -> position in order, the last tie-breaker
+    cdef int[:] order_pos
+
+    # Live domains (forward checking)
+    # Bit v of dom_bits is set while values[v] is still consistent for its node
+    cdef bint use_domains
+    cdef UINT64_t[:] dom_bits
+    # [node_idx] -> number of live values
+    cdef int[:] domain_size
+    # Trail of removed values (node_idx, value row), undone in LIFO order
+    cdef int[:] trail_node
+    cdef int[:] trail_value
+    cdef int trail_len
+    # Visit stamps to prune each neighbour once per move
+    cdef int[:] visit_mark
+    cdef int visit_stamp
+    # [depth] -> node assigned at that depth
+    cdef int[:] path
+    # Static ordering: order[depth] is the node tried at that depth. The search succeeds once
+    # the first num_search entries are assigned; nodes outside them keep their assignment.
+    cdef int[:] order
+    cdef int num_search
+    # No progress lines (sub-searches run by the large neighbourhood search)
+    cdef bint quiet
+    # Warm start: [node_idx] -> value row of a previous schedule (-1 if none)
+    cdef int[:] initial_value
+
+    # Explicit stack for the iterative engine
+    # [depth] -> next value row to try / trail length right after that depth's move
+    cdef int[:] stack_next
+    cdef int[:] stack_mark
+    # [depth] -> saved phase of the node at that depth, tried before its other values (-1 if none)
+    cdef int[:] stack_phase
+
+    # Symmetry breaking: consecutive units of the same group and subject with the same candidate
+    # set are interchangeable, so each chain (sym_prev / sym_next) must take non-decreasing
+    # value_key[v], a day order shared by the whole chain. Slots within a day are left free:
+    # the max-gap rule is checked on insertion, so their insertion order matters.
+    cdef bint use_symmetry
+    cdef int[:] sym_prev
+    cdef int[:] sym_next
+    cdef int[:] value_key
+    # Interchangeable professors (same maxHoras and same candidate (node, day, slot) rows,
+    # i.e. same competencias and disponibilidad): prof_class_prev[p] -> previous member
+    # of p's class, or -1
+    cdef int[:] prof_class_prev
+
+    # Conflict-directed backjumping
+    # conflicts[depth] -> bitset of earlier depths whose assignments explain the
+    # failures seen at this depth; the search jumps back to the highest one
+    cdef bint use_cbj
+    cdef UINT64_t[:, :] conflicts
+    # [depth] -> 1 if the conflict set relies on a search-order dependent explanation
+    # (the max-gap rule under dynamic ordering) and must not be learned as a nogood
+    cdef int[:] conflict_unsafe
+    # Node whose domain was wiped out by the last failed prune_neighbours
+    cdef int wipe_node
+    # [node_idx][day] -> bitmask of the slots the node has candidate values for
+    cdef int[:, :] node_slot_mask
+    # Reasons already recorded during the current explanation pass: values sharing a
+    # day, slot or professor share most of their explanation
+    cdef int[:] explained_prof
+    cdef int explain_stamp
+    cdef bint explained_subject
+    cdef int explained_days
+    cdef int explained_subject_days
+    # Days with a max-gap rejection and, per day, the slots that would close one of the gaps
+    cdef int gap_days
+    cdef int[:] gap_slots
+
+    # Learned nogoods: value rows ng_lits[ng_start[k]:ng_start[k + 1]] cannot all hold together.
+    # Their literals are stored deepest first and each nogood is indexed by that last literal:
+    # ng_head[v] -> first nogood whose last literal is value row v (linked through ng_next)
+    cdef int[:] value_node
+    cdef int[:] ng_lits
+    cdef int[:] ng_start
+    cdef int ng_count
+    cdef int[:] ng_head
+    cdef int[:] ng_next
+
+    # Best Partial Solution, stored as a path: best_path[k] got value row best_value[k]
+    # for k < max_assigned_count. The first best_synced entries also match the
+    # current path, so a new best only copies the levels that changed since.
     cdef int max_assigned_count
-    cdef list best_assignments
+    cdef int[:] best_path
+    cdef int[:] best_value
+    cdef int best_synced
+
+    # Progress reporting
+    cdef double last_progress_time
+    cdef int last_logged_count
     
     # Time Limit
     cdef double start_time
@@ -80,8 +322,68 @@ cdef class GraphScheduler:
     cdef long long call_count
     cdef bint time_limit_reached
 
-    def __init__(self, nodes, num_days, num_slots, profesores, grupos, materias):
+    # Local search
+    # xorshift64* state of the move generator
+    cdef UINT64_t rng_state
+    cdef int ls_unassigned
+    # Warm-started nodes away from their initial_value
+    cdef int ls_moved
+    cdef int ls_best_cost
+    cdef int[:] ls_best_value
+    # [node_idx] -> iteration until which the node may not be ejected or swapped out
+    cdef long long[:] tabu_until
+    # Undo log of the move being evaluated: node and its value before each change
+    cdef int mv_node[16]
+    cdef int mv_old[16]
+    cdef int mv_len
+
+    # Branch and bound (algorithm 'optimize'): incumbent complete schedule and its cost
+    # (total gaps + short days). Branches whose lower bound reaches it are cut.
+    cdef bint use_bound
+    cdef int incumbent_cost
+    cdef int[:] incumbent_value
+    # [group_idx][day][slot] -> unassigned nodes of the group with a candidate there;
+    # supply_mask has the slots with a non-zero count
+    cdef int[:, :, :] slot_supply
+    cdef int[:, :] supply_mask
+    # [group_idx] -> lower bound on the group's final cost; bound_total sums them
+    cdef int[:] group_bound
+    cdef int bound_total
+
+    # Phase saving: [node_idx] -> its value in the deepest partial schedule found so far (or in
+    # the incumbent when optimizing), seeded by a greedy pass. The search restarts from the root
+    # (keeping the phases) after fail_limit dead ends, with a geometrically growing limit.
+    # Classic phase saving keeps each node's last successfully assigned value instead; on this
+    # problem that steers every restart back into the subtree that just failed (10 s on the
+    # real data: 228/245 hours instead of 245, and optimize 139 instead of 208), so the phases
+    # follow the best schedule found (solution-guided phases).
+    cdef bint use_phases
+    cdef int[:] saved_value
+    cdef long long fail_count
+    cdef long long fail_limit
+    cdef bint restart_requested
+
+    # Large neighbourhood search: values of the freed nodes before the current repair
+    cdef int[:] lns_old_value
+
+    # Optional external stop request: a shared C int (e.g. multiprocessing.RawValue('i'))
+    # that another thread or process sets to non-zero to abort the search
+    cdef object stop_flag_ref
+    cdef volatile int* stop_flag
+
+    # Optional progress callback (set_progress): called with an event dict whenever a
+    # progress line is printed, with the schedule it describes if progress_schedule is set,
+    # and every PROGRESS_INTERVAL seconds with the last event brought up to date otherwise
+    cdef object progress
+    cdef bint progress_schedule
+    cdef bint has_progress
+    cdef object last_event
+    cdef double last_heartbeat_time
+
+    def __init__(self, nodes, values, value_start, num_days, num_slots, profesores, grupos, materias):
         self.nodes = nodes
+        self.values = values
+        self.value_start = value_start
         self.num_days = num_days
         self.num_slots = num_slots
         self.num_profs = len(profesores)
@@ -94,10 +396,16 @@ cdef class GraphScheduler:
         self.materia_to_idx = {m['id']: i for i, m in enumerate(materias)}
         
         # Initialize state arrays
-        self.prof_schedule = np.zeros((self.num_profs, num_days, num_slots), dtype=np.int32)
-        self.group_schedule = np.zeros((len(grupos), num_days, num_slots), dtype=np.int32)
+        self.prof_schedule = np.zeros((self.num_profs, num_days), dtype=np.int32)
+        self.group_schedule = np.zeros((len(grupos), num_days), dtype=np.int32)
+        self.group_gaps = np.zeros(len(grupos), dtype=np.int32)
+        self.group_short_days = np.zeros(len(grupos), dtype=np.int32)
+        self.total_gaps = 0
+        self.total_short_days = 0
         self.prof_load = np.zeros(self.num_profs, dtype=np.int32)
         self.prof_max_load = np.array([p['maxHoras'] for p in profesores], dtype=np.int32)
+        self.prof_owner = np.full((self.num_profs, num_days, num_slots), -1, dtype=np.int32)
+        self.group_owner = np.full((len(grupos), num_days, num_slots), -1, dtype=np.int32)
         
         self.group_materia_day_count = np.zeros((len(grupos), len(materias), num_days), dtype=np.int32)
         self.group_materia_day_slots = np.zeros((len(grupos), len(materias), num_days), dtype=np.int32)
@@ -108,128 +416,1587 @@ cdef class GraphScheduler:
         self.prof_group_subject = np.full((self.num_profs, len(grupos)), -1, dtype=np.int32)
         self.prof_group_subject_count = np.zeros((self.num_profs, len(grupos)), dtype=np.int32)
 
+        self.num_nodes = len(nodes)
+        self.node_group = np.array([self.group_to_idx[n.grupo_id] for n in nodes], dtype=np.int32)
+        self.node_materia = np.array([self.materia_to_idx[n.materia_id] for n in nodes], dtype=np.int32)
+        self.node_value = np.full(self.num_nodes, -1, dtype=np.int32)
+        self.node_depth = np.full(self.num_nodes, -1, dtype=np.int32)
+        self.node_length = np.array([n.length for n in nodes], dtype=np.int32)
+        lengths = np.repeat(np.asarray(self.node_length), np.diff(np.asarray(value_start)))
+        self.value_mask = (((1 << lengths) - 1) << np.asarray(values)[:, 1]).astype(np.int32)
+        self.path = np.full(self.num_nodes, -1, dtype=np.int32)
+        self.order = np.arange(self.num_nodes, dtype=np.int32)
+        self.num_search = self.num_nodes
+        self.quiet = False
+        self.initial_value = np.full(self.num_nodes, -1, dtype=np.int32)
+        self.stack_next = np.zeros(self.num_nodes, dtype=np.int32)
+        self.stack_mark = np.zeros(self.num_nodes, dtype=np.int32)
+        self.stack_phase = np.full(self.num_nodes, -1, dtype=np.int32)
+
         self.max_assigned_count = -1
-        self.best_assignments = []
+        self.best_path = np.zeros(self.num_nodes, dtype=np.int32)
+        self.best_value = np.zeros(self.num_nodes, dtype=np.int32)
+        self.best_synced = 0
+        self.use_mrv = False
+        self.use_domains = False
+        self.use_cbj = False
+        self.use_symmetry = False
+        self.use_bound = False
+        self.stop_flag = NULL
 
         # Pre-fill availability (blocked slots = busy)
         # Note: In a full implementation, we would mark blocked slots in prof_schedule here.
-        # For now, we assume the 'possible_assignments' passed to us already filter out blocked slots.
+        # For now, we assume the candidate values passed to us already filter out blocked slots.
         pass
 
-    def solve(self, algorithm='backtracking', time_limit=300):
-        if algorithm == 'greedy':
-            return self.solve_greedy()
+    def build_interaction_graph(self, int num_groups):
+        # Nodes interact when they share a group or could share a professor:
+        # an assignment (group g, prof p) can only change the valid
+        # assignments of nodes in group_nodes[g] and prof_nodes[p].
+        cdef int i
+        value_profs = np.asarray(self.values)[:, 2]
+        group_members = [[] for _ in range(num_groups)]
+        prof_members = [[] for _ in range(self.num_profs)]
+        node_profs = []
+        for i in range(self.num_nodes):
+            group_members[self.node_group[i]].append(i)
+            profs = np.unique(value_profs[self.value_start[i]:self.value_start[i + 1]]).tolist()
+            node_profs.append(profs)
+            for p in profs:
+                prof_members[p].append(i)
+
+        self.group_nodes_start, self.group_nodes = self._to_csr(group_members)
+        self.prof_nodes_start, self.prof_nodes = self._to_csr(prof_members)
+
+        degree = np.zeros(self.num_nodes, dtype=np.int32)
+        for i in range(self.num_nodes):
+            neighbours = set(group_members[self.node_group[i]])
+            for p in node_profs[i]:
+                neighbours.update(prof_members[p])
+            degree[i] = len(neighbours) - 1
+        self.node_degree = degree
+
+    def build_domains(self):
+        total = self.value_start[self.num_nodes]
+        self.dom_bits = np.zeros((total + 63) // 64, dtype=np.uint64)
+        self.domain_size = np.zeros(self.num_nodes, dtype=np.int32)
+        # Values are only ever removed along a search path, so the trail
+        # never holds more entries than there are values in total.
+        self.trail_node = np.zeros(total, dtype=np.int32)
+        self.trail_value = np.zeros(total, dtype=np.int32)
+        self.trail_len = 0
+        self.visit_mark = np.zeros(self.num_nodes, dtype=np.int32)
+        self.visit_stamp = 0
+        sizes = np.diff(np.asarray(self.value_start))
+        self.bucket_head = np.full((sizes.max() if len(sizes) else 0) + 1, -1, dtype=np.int32)
+        self.bucket_next = np.full(self.num_nodes, -1, dtype=np.int32)
+        self.bucket_prev = np.full(self.num_nodes, -1, dtype=np.int32)
+        self.bucket_of = np.full(self.num_nodes, -1, dtype=np.int32)
+        self.order_pos = np.zeros(self.num_nodes, dtype=np.int32)
+
+    cdef void init_domains(self) noexcept nogil:
+        cdef int i, k, v
+        for i in range(self.num_nodes):
+            for v in range(self.value_start[i], self.value_start[i + 1]):
+                self.dom_bits[v >> 6] |= (<UINT64_t>1) << (v & 63)
+            self.domain_size[i] = self.value_start[i + 1] - self.value_start[i]
+            self.prune_node(i)
+        # Values that are inconsistent from the start are never restored
+        self.trail_len = 0
+        if self.use_mrv:
+            self.bucket_min = 0
+            for k in range(self.num_search):
+                i = self.order[k]
+                self.order_pos[i] = k
+                if self.node_value[i] == -1:
+                    self.bucket_insert(i)
+
+    def build_symmetry(self):
+        values = np.asarray(self.values)
+        value_start = np.asarray(self.value_start)
+        node_group = np.asarray(self.node_group)
+        node_materia = np.asarray(self.node_materia)
+        node_length = np.asarray(self.node_length)
+        node_value = np.asarray(self.node_value)
+        sym_prev = np.full(self.num_nodes, -1, dtype=np.int32)
+        sym_next = np.full(self.num_nodes, -1, dtype=np.int32)
+        value_key = np.zeros(len(values), dtype=np.int32)
+        prev_key = None
+        first_day = 0
+        for i in range(self.num_nodes):
+            rows = values[value_start[i]:value_start[i + 1]]
+            key = (node_group[i], node_materia[i], node_length[i],
+                   rows[np.lexsort(rows.T[::-1])].tobytes())
+            # Warm-started assignments are fixed, so they stay out of the chains
+            if key == prev_key and node_value[i] == -1 and node_value[i - 1] == -1:
+                sym_prev[i] = i - 1
+                sym_next[i - 1] = i
+            elif len(rows):
+                first_day = rows[0, 0]
+            prev_key = key
+            # Keys start at the chain's first day so the canonical order follows the
+            # day rotation of the candidate lists
+            value_key[value_start[i]:value_start[i + 1]] = (rows[:, 0] - first_day) % self.num_days
+        self.sym_prev = sym_prev
+        self.sym_next = sym_next
+        self.value_key = value_key
+
+        # Professor classes from the candidate rows each professor appears in
+        rows = np.column_stack((np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(value_start)),
+                                values[:, 0], values[:, 1]))
+        rows = rows[np.lexsort((rows[:, 2], rows[:, 1], rows[:, 0], values[:, 2]))]
+        bounds = np.searchsorted(np.sort(values[:, 2]), np.arange(self.num_profs + 1))
+        prof_max_load = np.asarray(self.prof_max_load)
+        prof_class_prev = np.full(self.num_profs, -1, dtype=np.int32)
+        classes = {}
+        for p in range(self.num_profs):
+            key = (prof_max_load[p], rows[bounds[p]:bounds[p + 1]].tobytes())
+            prof_class_prev[p] = classes.get(key, -1)
+            classes[key] = p
+        self.prof_class_prev = prof_class_prev
+
+    def build_slot_masks(self):
+        values = np.asarray(self.values)
+        value_node = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.value_start))
+        slot_mask = np.zeros((self.num_nodes, self.num_days), dtype=np.int32)
+        np.bitwise_or.at(slot_mask, (value_node, values[:, 0]), np.asarray(self.value_mask))
+        self.node_slot_mask = slot_mask
+
+    def build_bound(self):
+        # Nothing is assigned yet: every candidate slot is still supplied
+        num_groups = len(self.idx_to_group_id)
+        node_group = np.asarray(self.node_group)
+        slot_mask = np.asarray(self.node_slot_mask)
+        bits = (slot_mask[:, :, None] >> np.arange(self.num_slots)) & 1
+        supply = np.zeros((num_groups, self.num_days, self.num_slots), dtype=np.int32)
+        np.add.at(supply, node_group, bits)
+        masks = np.zeros((num_groups, self.num_days), dtype=np.int32)
+        np.bitwise_or.at(masks, node_group, slot_mask)
+        self.slot_supply = supply
+        self.supply_mask = masks
+        self.group_bound = np.zeros(num_groups, dtype=np.int32)
+        self.bound_total = 0
+        # Warm-started assignments already took their slots out of the supply
+        for i in np.flatnonzero(np.asarray(self.node_value) != -1):
+            self.update_bound(i, -1)
+
+    def build_conflicts(self):
+        total = self.value_start[self.num_nodes]
+        self.conflicts = np.zeros((self.num_nodes + 1, (self.num_nodes + 63) // 64), dtype=np.uint64)
+        self.conflict_unsafe = np.zeros(self.num_nodes + 1, dtype=np.int32)
+        self.wipe_node = -1
+        self.value_node = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.value_start))
+        self.build_slot_masks()
+        self.explained_prof = np.zeros(self.num_profs, dtype=np.int32)
+        self.explain_stamp = 0
+        self.gap_slots = np.zeros(self.num_days, dtype=np.int32)
+        self.ng_lits = np.zeros(NOGOOD_CAPACITY, dtype=np.int32)
+        # Every nogood has at least one literal
+        self.ng_start = np.zeros(NOGOOD_CAPACITY + 1, dtype=np.int32)
+        self.ng_count = 0
+        self.ng_head = np.full(total, -1, dtype=np.int32)
+        self.ng_next = np.zeros(NOGOOD_CAPACITY, dtype=np.int32)
+
+    def set_stop_flag(self, flag):
+        # Keep a reference so the shared memory outlives the search
+        self.stop_flag_ref = flag
+        self.stop_flag = NULL if flag is None else <volatile int*><uintptr_t>ctypes.addressof(flag)
+
+    def set_progress(self, callback, schedule=False):
+        self.progress = callback
+        self.progress_schedule = schedule
+        self.has_progress = callback is not None
+        self.last_event = None
+
+    cdef void report_progress(self, int depth) noexcept with gil:
+        # Sends a progress event to the callback. depth >= 0 describes the deepest partial
+        # schedule (its first depth searched nodes plus the kept ones) or, once optimize has
+        # one, the incumbent; -1 the current state, which is the best one when local search
+        # or optimize report it
+        cdef int i, k, v, assigned = 0
+        cdef int[:] node_values
+        cost = None
+        if self.progress is None:
+            return
+        if depth >= 0 and self.use_bound and self.incumbent_cost < (1 << 30):
+            node_values = self.incumbent_value
+            cost = self.incumbent_cost
+        elif depth >= 0:
+            node_values = np.full(self.num_nodes, -1, dtype=np.int32)
+            for k in range(self.num_search, self.num_nodes):
+                node_values[self.order[k]] = self.node_value[self.order[k]]
+            for k in range(depth):
+                node_values[self.best_path[k]] = self.best_value[k]
         else:
+            node_values = self.node_value
+            cost = self.total_gaps + self.total_short_days
+        for i in range(self.num_nodes):
+            if node_values[i] != -1:
+                assigned += 1
+        event = {
+            'asignados': assigned,
+            'total': self.num_nodes,
+            'tiempoMs': int((monotonic_time() - self.start_time) * 1000),
+            'nodosExplorados': self.call_count,
+            # Gaps plus short days of a complete or local-search schedule (partial ones have none yet)
+            'costo': cost
+        }
+        if self.progress_schedule:
+            event['asignaciones'] = []
+            for i in range(self.num_nodes):
+                v = node_values[i]
+                if v != -1:
+                    event['asignaciones'].append(assignment_dict(self.nodes[i], self.idx_to_prof_id[self.values[v, 2]],
+                                                                 self.values[v, 0], self.values[v, 1]))
+        self.last_event = event
+        self.progress(event)
+
+    cdef void report_heartbeat(self) noexcept with gil:
+        # Nothing improved since the last event: send it again with the current elapsed
+        # time and explored nodes, so a client can tell a long search from a stalled one
+        if self.last_event is None:
+            return
+        event = dict(self.last_event)
+        event['tiempoMs'] = int((monotonic_time() - self.start_time) * 1000)
+        event['nodosExplorados'] = self.call_count
+        self.progress(event)
+
+    def seed_phases(self):
+        # Greedy pass over the searched nodes: its values (or, for nodes freed from a warm
+        # start, their previous ones) are the initial saved phases. A complete greedy schedule
+        # is already a solution, or the first incumbent when optimizing. Returns True if the
+        # search can be skipped.
+        cdef int i, k, v
+        cdef bint complete = True
+        if self.use_symmetry:
+            # The greedy schedule must respect the same canonical orders as the search
+            self.build_symmetry()
+        self.saved_value = np.full(self.num_nodes, -1, dtype=np.int32)
+        for k in range(self.num_search):
+            i = self.order[k]
+            for v in range(self.value_start[i], self.value_start[i + 1]):
+                if self.is_valid(i, v):
+                    self.apply_move(i, v)
+                    self.saved_value[i] = v
+                    break
+            if self.node_value[i] == -1:
+                complete = False
+            if self.initial_value[i] != -1:
+                self.saved_value[i] = self.initial_value[i]
+        if complete and not self.use_bound:
+            print("Greedy pass placed every node")
+            return True
+        if complete:
+            self.record_incumbent()
+        for k in range(self.num_search):
+            i = self.order[k]
+            if self.node_value[i] != -1:
+                self.undo_move(i)
+        return False
+
+    def prepare_search(self):
+        # Per-search state built from the current assignment (warm-started nodes included)
+        self.max_assigned_count = -1
+        self.best_synced = 0
+        self.call_count = 0
+        self.time_limit_reached = False
+        if self.use_bound:
+            self.build_bound()
+        if self.use_symmetry:
+            self.build_symmetry()
+        if self.use_domains:
+            self.build_domains()
+            self.init_domains()
+        if self.use_cbj:
+            # Nogoods learned with a different set of kept assignments do not carry over
+            self.build_conflicts()
+
+    def widen_search(self):
+        # The nodes the best partial schedule left out could not fit around the kept
+        # assignments: free the kept nodes of their groups, then (if none are left) those of
+        # their candidate professors, and finally everything. Returns the number freed.
+        cdef int i, k
+        failed = [self.order[k] for k in range(self.num_search) if self.node_value[self.order[k]] == -1]
+        for k in range(self.num_search):
+            i = self.order[k]
+            if self.node_value[i] != -1:
+                self.undo_move(i)
+        values = np.asarray(self.values)
+        value_start = np.asarray(self.value_start)
+        groups = {self.node_group[i] for i in failed}
+        profs = set()
+        for i in failed:
+            profs.update(values[value_start[i]:value_start[i + 1], 2].tolist())
+        freed = [i for i in range(self.num_nodes) if self.node_value[i] != -1 and self.node_group[i] in groups]
+        if not freed:
+            freed = [i for i in range(self.num_nodes) if self.node_value[i] != -1 and values[self.node_value[i], 2] in profs]
+        if not freed:
+            freed = [i for i in range(self.num_nodes) if self.node_value[i] != -1]
+        for i in freed:
+            self.undo_move(i)
+        assigned = np.asarray(self.node_value) != -1
+        self.order = np.concatenate((np.flatnonzero(~assigned), np.flatnonzero(assigned))).astype(np.int32)
+        self.num_search = int((~assigned).sum())
+        return len(freed)
+
+    def set_initial(self, initial_value):
+        # Previous schedule to warm-start from, as value rows (see apply_initial)
+        self.initial_value = np.ascontiguousarray(initial_value, dtype=np.int32)
+
+    def apply_initial(self):
+        # Keep every previous assignment that is still valid and move the other nodes to the
+        # front of the search order: the search only walks order[:num_search]. Each day is
+        # rebuilt in slot order, so a gap-free previous day never opens a long gap on the way.
+        cdef int i, v
+        initial = np.asarray(self.initial_value)
+        pinned = np.flatnonzero(initial != -1)
+        if len(pinned) == 0:
+            return 0
+        rows = np.asarray(self.values)[initial[pinned]]
+        for i in pinned[np.lexsort((rows[:, 1], rows[:, 0]))]:
+            v = self.initial_value[i]
+            if self.node_value[i] == -1 and self.is_valid(i, v):
+                self.apply_move(i, v)
+        assigned = np.asarray(self.node_value) != -1
+        self.order = np.concatenate((np.flatnonzero(~assigned), np.flatnonzero(assigned))).astype(np.int32)
+        self.num_search = int((~assigned).sum())
+        return self.num_nodes - self.num_search
+
+    @staticmethod
+    def _to_csr(members):
+        starts = np.zeros(len(members) + 1, dtype=np.int32)
+        for i, m in enumerate(members):
+            starts[i + 1] = starts[i] + len(m)
+        flat = np.array([x for m in members for x in m], dtype=np.int32)
+        return starts, flat
+
+    def solve(self, algorithm='backtracking', time_limit=300, ordering='static', forward_checking=False, engine='iterative', backjumping=False, seed=0, symmetry=True, phase_saving=False):
+        cdef bint success
+        if ordering not in ('static', 'mrv'):
+            raise ValueError(f"Unknown ordering: {ordering}")
+        if engine not in ('iterative', 'recursive'):
+            raise ValueError(f"Unknown engine: {engine}")
+        if backjumping and engine != 'iterative':
+            raise ValueError("Backjumping requires the iterative engine")
+        if algorithm == 'optimize' and (backjumping or engine != 'iterative'):
+            raise ValueError("Optimization requires the iterative engine without backjumping")
+        if phase_saving and engine != 'iterative':
+            raise ValueError("Phase saving requires the iterative engine")
+
+        kept = self.apply_initial()
+        if kept:
+            print(f"Warm start: kept {kept} assignments, searching {self.num_search} nodes")
+
+        if algorithm == 'greedy':
+            success = self.solve_greedy()
+        elif algorithm in ('local-search', 'lns'):
+            # Improvement phases start from the greedy schedule
+            self.solve_greedy()
             self.time_limit = time_limit
-            self.start_time = time.time()
-            self.call_count = 0
+            self.start_time = monotonic_time()
             self.time_limit_reached = False
-            print(f"Starting backtracking with time limit: {time_limit}s")
-            
-            success = self.backtrack(0)
-            if not success and self.max_assigned_count > -1:
+            # Any non-zero state works; 0 would stay 0 forever
+            self.rng_state = 0x9E3779B97F4A7C15 ^ <UINT64_t>seed
+            self.ls_best_value = np.full(self.num_nodes, -1, dtype=np.int32)
+            if algorithm == 'local-search':
+                self.tabu_until = np.zeros(self.num_nodes, dtype=np.int64)
+                print(f"Starting local search with time limit: {time_limit}s")
+                with nogil:
+                    success = self.solve_local_search()
+            else:
+                self.build_interaction_graph(len(self.idx_to_group_id))
+                self.lns_old_value = np.full(self.num_nodes, -1, dtype=np.int32)
+                print(f"Starting large neighbourhood search with time limit: {time_limit}s")
+                with nogil:
+                    success = self.solve_lns()
+        else:
+            self.start_time = monotonic_time()
+            self.last_progress_time = -PROGRESS_INTERVAL
+            self.last_logged_count = -1
+            self.use_mrv = ordering == 'mrv'
+            # MRV reads its domain sizes from the live domains, so it implies forward checking
+            self.use_domains = self.use_mrv or forward_checking
+            self.use_cbj = backjumping
+            self.use_symmetry = symmetry
+            self.use_bound = algorithm == 'optimize'
+            if self.use_bound:
+                self.incumbent_cost = 1 << 30
+                self.incumbent_value = np.full(self.num_nodes, -1, dtype=np.int32)
+                self.build_slot_masks()
+            self.use_phases = phase_saving
+            print(f"Starting {'branch and bound' if self.use_bound else 'backtracking'} ({engine} engine, {ordering} ordering, forward checking: {self.use_domains}, backjumping: {self.use_cbj}, symmetry breaking: {self.use_symmetry}, phase saving: {self.use_phases}) with time limit: {time_limit}s")
+
+            if self.use_domains or self.use_cbj:
+                self.build_interaction_graph(len(self.idx_to_group_id))
+
+            success = False
+            if self.use_phases:
+                success = self.seed_phases()
+
+            while not success:
+                # A warm start that cannot place its free nodes gets a short round, then
+                # frees the kept assignments around the failures and searches again. Once
+                # there is an incumbent, the round only improves it.
+                last_round = self.num_search == self.num_nodes or (self.use_bound and self.incumbent_cost < (1 << 30))
+                self.time_limit = time_limit if last_round else min(monotonic_time() - self.start_time + WARM_ROUND_TIME, time_limit)
+                self.quiet = not last_round
+                self.prepare_search()
+                if engine == 'iterative':
+                    with nogil:
+                        success = self.search_restarts()
+                else:
+                    success = self.backtrack(0)
+                if (success or last_round or (self.use_bound and self.incumbent_cost < (1 << 30))
+                        or monotonic_time() - self.start_time > time_limit
+                        or (self.stop_flag != NULL and self.stop_flag[0])):
+                    break
+                self.restore_best()
+                print(f"Warm start: {self.widen_search()} kept assignments freed, searching {self.num_search} nodes")
+            self.time_limit = time_limit
+            self.quiet = False
+
+            if self.last_logged_count != self.max_assigned_count:
+                self.log_new_best(self.max_assigned_count)
+            if self.use_bound and self.incumbent_cost < (1 << 30):
+                # Finished (optimal) or stopped: the best complete schedule found. With kept
+                # warm-start assignments the search only proved it optimal around them
+                self.restore_incumbent()
+                success = True
+                if self.time_limit_reached:
+                    proof = ''
+                elif self.num_search < self.num_nodes:
+                    proof = f' (optimal with {self.num_nodes - self.num_search} warm-start assignments kept fixed)'
+                else:
+                    proof = ' (optimal)'
+                print(f"Best schedule: {self.total_gaps} gaps, {self.total_short_days} short days{proof}")
+            elif not success and self.max_assigned_count > -1:
                 # Restore best assignments
                 self.restore_best()
-                return False # It's a partial solution
-            return success
+                # It's a partial solution
+        self.sync_nodes()
+        return success
 
-    cdef void restore_best(self):
-        # Restore the node states from best_assignments
-        cdef int i
+    cdef void sync_nodes(self):
+        # Copy the assignment state onto the Node objects
+        cdef int i, v
         cdef Node node
-        for i in range(len(self.best_assignments)):
-            state = self.best_assignments[i]
+        for i in range(self.num_nodes):
             node = self.nodes[i]
-            node.assigned_day = state[0]
-            node.assigned_slot = state[1]
-            node.assigned_prof = state[2]
+            v = self.node_value[i]
+            if v == -1:
+                node.assigned_day = -1
+                node.assigned_slot = -1
+                node.assigned_prof = -1
+            else:
+                node.assigned_day = self.values[v, 0]
+                node.assigned_slot = self.values[v, 1]
+                node.assigned_prof = self.values[v, 2]
 
-    cdef bint solve_greedy(self):
+    cdef void restore_best(self) noexcept nogil:
+        # Replace the current assignment of the searched nodes with the best partial solution
+        cdef int i, k
+        for k in range(self.num_search):
+            i = self.order[k]
+            if self.node_value[i] != -1:
+                self.undo_move(i)
+        for k in range(self.max_assigned_count):
+            self.apply_move(self.best_path[k], self.best_value[k])
+
+    cdef void record_incumbent(self) noexcept nogil:
         cdef int i
-        cdef Node node
-        cdef int group_idx, materia_idx
-        cdef int day_idx, slot_idx, prof_idx
+        self.incumbent_cost = self.total_gaps + self.total_short_days
+        for i in range(self.num_nodes):
+            self.incumbent_value[i] = self.node_value[i]
+            if self.use_phases and self.node_value[i] != -1:
+                self.saved_value[i] = self.node_value[i]
+        self.log_incumbent()
+
+    cdef void restore_incumbent(self) noexcept nogil:
+        cdef int i
+        for i in range(self.num_nodes):
+            if self.node_value[i] != -1:
+                self.undo_move(i)
+        for i in range(self.num_nodes):
+            if self.incumbent_value[i] != -1:
+                self.apply_move(i, self.incumbent_value[i])
+
+    cdef inline int value_limit(self, int node_idx) noexcept nogil:
+        # End of the stack_next range of a node (two passes over its values with the bound)
+        if self.use_bound:
+            return 2 * self.value_start[node_idx + 1] - self.value_start[node_idx]
+        return self.value_start[node_idx + 1]
+
+    cdef inline bint adds_no_gap(self, int node_idx, int v) noexcept nogil:
+        cdef unsigned int mask = self.group_schedule[self.node_group[node_idx], self.values[v, 0]]
+        return day_gaps(mask | self.value_mask[v]) <= day_gaps(mask)
+
+    cdef void update_bound(self, int node_idx, int delta) noexcept nogil:
+        # The node's candidate slots leave (delta -1, once assigned) or rejoin (+1) its group's
+        # supply; then the group's bound is recomputed. A gap slot nobody can fill stays a
+        # gap (a day's span only grows), and a day whose classes plus supplied slots are
+        # fewer than MIN_DAY_CLASSES stays short.
+        cdef int group_idx = self.node_group[node_idx]
+        cdef int d, s, mask, supplied
+        cdef int bound = 0
+        for d in range(self.num_days):
+            mask = self.node_slot_mask[node_idx, d]
+            for s in range(self.num_slots):
+                if not (mask >> s) & 1:
+                    continue
+                self.slot_supply[group_idx, d, s] += delta
+                if self.slot_supply[group_idx, d, s] == 0:
+                    self.supply_mask[group_idx, d] &= ~(1 << s)
+                else:
+                    self.supply_mask[group_idx, d] |= 1 << s
+        for d in range(self.num_days):
+            mask = self.group_schedule[group_idx, d]
+            supplied = self.supply_mask[group_idx, d]
+            bound += popcount(day_span(mask) & ~mask & ~supplied)
+            if mask and popcount(mask | supplied) < MIN_DAY_CLASSES:
+                bound += 1
+        self.bound_total += bound - self.group_bound[group_idx]
+        self.group_bound[group_idx] = bound
+
+    cdef void log_incumbent(self) noexcept with gil:
+        elapsed = monotonic_time() - self.start_time
+        print(f"New best schedule: {self.total_gaps} gaps, {self.total_short_days} short days - Time: {elapsed:.2f}s")
+        self.report_progress(-1)
+
+    cdef void snapshot_best(self, int depth) noexcept nogil:
+        # Only the levels below best_synced can differ from the stored best path
+        cdef int k
+        cdef double now
+        for k in range(self.best_synced, depth):
+            self.best_path[k] = self.path[k]
+            self.best_value[k] = self.node_value[self.path[k]]
+            if self.use_phases:
+                self.saved_value[self.path[k]] = self.best_value[k]
+        self.best_synced = depth
+        self.max_assigned_count = depth
+
+        if self.quiet:
+            return
+        now = monotonic_time()
+        if now - self.last_progress_time >= PROGRESS_INTERVAL:
+            self.last_progress_time = now
+            self.log_new_best(depth)
+
+    cdef bint push_move(self, int depth, int node_idx, int v) noexcept nogil:
+        # Assign node_idx at this depth; False (and nothing applied) on a forward-checking wipe-out
+        self.node_depth[node_idx] = depth
+        self.apply_move(node_idx, v)
+        if self.use_bound:
+            self.update_bound(node_idx, -1)
+        if self.use_mrv:
+            self.bucket_remove(node_idx)
+        self.stack_mark[depth] = self.trail_len
+        if not self.use_domains or self.prune_neighbours(node_idx):
+            return True
+        # Some future node has no value left: reject without descending
+        if self.use_cbj:
+            self.explain_wipeout(depth, self.wipe_node)
+        self.restore_domains(self.stack_mark[depth])
+        self.undo_move(node_idx)
+        if self.use_bound:
+            self.update_bound(node_idx, 1)
+        if self.use_mrv:
+            self.bucket_insert(node_idx)
+        return False
+
+    cdef void pop_move(self, int depth) noexcept nogil:
+        # Undo the move made at this depth
+        self.restore_domains(self.stack_mark[depth])
+        self.undo_move(self.path[depth])
+        if self.use_bound:
+            self.update_bound(self.path[depth], 1)
+        if self.use_mrv:
+            self.bucket_insert(self.path[depth])
+        if self.best_synced > depth:
+            self.best_synced = depth
+
+    cdef void log_new_best(self, int depth) noexcept with gil:
+        self.last_logged_count = depth
+        elapsed = monotonic_time() - self.start_time
+        percentage = (depth / self.num_nodes) * 100 if self.num_nodes else 100.0
+        last_node_info = ""
+        if depth > 0:
+            last_node = <Node>self.nodes[self.best_path[depth - 1]]
+            prof_id = self.idx_to_prof_id[self.values[self.best_value[depth - 1], 2]]
+            last_node_info = f" - Last: {last_node.grupo_id} {last_node.materia_id} -> {prof_id}"
+
+        print(f"New best solution found: {depth}/{self.num_nodes} ({percentage:.1f}%) - Time: {elapsed:.2f}s{last_node_info}")
+        self.report_progress(depth)
+
+    cdef bint out_of_time(self) noexcept nogil:
+        # Periodic check: flush a pending progress line (or, with a progress callback and
+        # nothing new for PROGRESS_INTERVAL, repeat the last event) and test the time limit
+        # and the external stop flag
+        cdef double now = monotonic_time()
+        if (not self.quiet and self.max_assigned_count != self.last_logged_count and
+                now - self.last_progress_time >= PROGRESS_INTERVAL):
+            self.last_progress_time = now
+            self.log_new_best(self.max_assigned_count)
+        elif (self.has_progress and now - self.last_progress_time >= PROGRESS_INTERVAL and
+                now - self.last_heartbeat_time >= PROGRESS_INTERVAL):
+            self.last_heartbeat_time = now
+            self.report_heartbeat()
+        if now - self.start_time > self.time_limit:
+            if not self.quiet:
+                self.log_time_limit()
+            self.time_limit_reached = True
+        elif self.stop_flag != NULL and self.stop_flag[0]:
+            if not self.quiet:
+                self.log_stopped()
+            self.time_limit_reached = True
+        return self.time_limit_reached
+
+    cdef void log_time_limit(self) noexcept with gil:
+        print(f"Time limit reached ({self.time_limit}s). Aborting search.")
+
+    cdef void log_stopped(self) noexcept with gil:
+        print("Stop requested. Aborting search.")
+
+    cdef inline UINT64_t next_random(self) noexcept nogil:
+        self.rng_state ^= self.rng_state >> 12
+        self.rng_state ^= self.rng_state << 25
+        self.rng_state ^= self.rng_state >> 27
+        return self.rng_state * 0x2545F4914F6CDD1DULL
+
+    cdef inline int random_below(self, int n) noexcept nogil:
+        return <int>((self.next_random() >> 11) % <UINT64_t>n)
+
+    cdef inline double random_unit(self) noexcept nogil:
+        return (self.next_random() >> 11) * (1.0 / 9007199254740992.0)
+
+    cdef inline bint is_moved(self, int node_idx, int v) noexcept nogil:
+        # True if value v (-1: unassigned) takes a warm-started node off its previous value
+        return self.initial_value[node_idx] != -1 and v != self.initial_value[node_idx]
+
+    cdef void count_moved(self) noexcept nogil:
+        cdef int i
+        self.ls_moved = 0
+        for i in range(self.num_nodes):
+            self.ls_moved += self.is_moved(i, self.node_value[i])
+
+    cdef void ls_assign(self, int node_idx, int v) noexcept nogil:
+        # Give node_idx value v (-1 leaves it unassigned)
+        self.ls_moved += self.is_moved(node_idx, v) - self.is_moved(node_idx, self.node_value[node_idx])
+        if self.node_value[node_idx] != -1:
+            self.undo_move(node_idx)
+            self.ls_unassigned += 1
+        if v != -1:
+            self.apply_move(node_idx, v)
+            self.ls_unassigned -= 1
+
+    cdef void ls_set(self, int node_idx, int v) noexcept nogil:
+        # ls_assign, recording the old value so ls_revert() can undo the whole move
+        self.mv_node[self.mv_len] = node_idx
+        self.mv_old[self.mv_len] = self.node_value[node_idx]
+        self.mv_len += 1
+        self.ls_assign(node_idx, v)
+
+    cdef void ls_revert(self) noexcept nogil:
+        while self.mv_len > 0:
+            self.mv_len -= 1
+            self.ls_assign(self.mv_node[self.mv_len], self.mv_old[self.mv_len])
+
+    cdef bint ls_gaps_ok(self) noexcept nogil:
+        # Moves place nodes with is_consistent; the max-gap rule is checked once the
+        # move is complete, on every day it touched (removals can open gaps too)
+        cdef int k, i, v
+        for k in range(self.mv_len):
+            i = self.mv_node[k]
+            v = self.mv_old[k]
+            if v != -1 and has_long_gap(self.group_schedule[self.node_group[i], self.values[v, 0]]):
+                return False
+            v = self.node_value[i]
+            if v != -1 and has_long_gap(self.group_schedule[self.node_group[i], self.values[v, 0]]):
+                return False
+        return True
+
+    cdef bint ls_accept(self, int delta, double temperature, long long iteration) noexcept nogil:
+        # Metropolis criterion; accepted moves protect their nodes for LS_TABU_TENURE iterations
+        cdef int k
+        if delta > 0 and self.random_unit() >= exp(-delta / temperature):
+            self.ls_revert()
+            return False
+        for k in range(self.mv_len):
+            self.tabu_until[self.mv_node[k]] = iteration + LS_TABU_TENURE
+        self.mv_len = 0
+        return True
+
+    cdef int ls_cost(self) noexcept nogil:
+        return LS_UNASSIGNED_WEIGHT * self.ls_unassigned + self.total_gaps + LS_MOVED_WEIGHT * self.ls_moved
+
+    cdef void ls_place_move(self, long long iteration, double temperature) noexcept nogil:
+        # Place a random unassigned node: directly if one of its values is valid, otherwise
+        # eject the nodes holding the group and professor slot of a random value and try
+        # to put them back elsewhere
+        cdef int start = self.random_below(self.num_nodes)
+        cdef int u = -1
+        cdef int k, i, j, v, w, n, first, group_idx, day_idx, slot_idx, prof_idx, bit
+        cdef int blockers[4]
+        cdef int num_blockers = 0
+        cdef int cost
+
+        for k in range(self.num_nodes):
+            i = (start + k) % self.num_nodes
+            if self.node_value[i] == -1:
+                u = i
+                break
+        if u == -1:
+            return
+        n = self.value_start[u + 1] - self.value_start[u]
+        if n == 0:
+            return
+        group_idx = self.node_group[u]
+        first = self.random_below(n)
+
+        self.mv_len = 0
+        for k in range(n):
+            v = self.value_start[u] + (first + k) % n
+            if self.is_valid(u, v):
+                cost = self.ls_cost()
+                self.ls_set(u, v)
+                # Always accepted: one more assigned node outweighs any gaps it opens
+                self.ls_accept(self.ls_cost() - cost, temperature, iteration)
+                return
+
+        v = self.value_start[u] + first
+        day_idx = self.values[v, 0]
+        prof_idx = self.values[v, 2]
+        for slot_idx in range(self.values[v, 1], self.values[v, 1] + self.node_length[u]):
+            bit = 1 << slot_idx
+            if self.group_schedule[group_idx, day_idx] & bit:
+                self.add_blocker(blockers, &num_blockers, self.group_owner[group_idx, day_idx, slot_idx])
+            if self.prof_schedule[prof_idx, day_idx] & bit:
+                self.add_blocker(blockers, &num_blockers, self.prof_owner[prof_idx, day_idx, slot_idx])
+        if num_blockers == 0:
+            return
+        for k in range(num_blockers):
+            if self.tabu_until[blockers[k]] > iteration:
+                return
+
+        cost = self.ls_cost()
+        for k in range(num_blockers):
+            self.ls_set(blockers[k], -1)
+        if not self.is_consistent(u, v):
+            self.ls_revert()
+            return
+        self.ls_set(u, v)
+        for k in range(num_blockers):
+            i = blockers[k]
+            n = self.value_start[i + 1] - self.value_start[i]
+            first = self.random_below(n)
+            for j in range(n):
+                w = self.value_start[i] + (first + j) % n
+                if self.is_valid(i, w):
+                    self.ls_set(i, w)
+                    break
+        if not self.ls_gaps_ok():
+            self.ls_revert()
+            return
+        self.ls_accept(self.ls_cost() - cost, temperature, iteration)
+
+    cdef inline void add_blocker(self, int* blockers, int* num_blockers, int node_idx) noexcept nogil:
+        # Append node_idx to the blocker list unless it is already there
+        cdef int k
+        for k in range(num_blockers[0]):
+            if blockers[k] == node_idx:
+                return
+        blockers[num_blockers[0]] = node_idx
+        num_blockers[0] += 1
+
+    cdef void ls_shift_move(self, long long iteration, double temperature) noexcept nogil:
+        # Move a random assigned node to another of its values; if the group already has a
+        # class in that slot, swap the two nodes
+        cdef int x = self.random_below(self.num_nodes)
+        cdef int old = self.node_value[x]
+        cdef int n = self.value_start[x + 1] - self.value_start[x]
+        cdef int group_idx = self.node_group[x]
+        cdef int v, w, y, cost, overlap
+        if old == -1 or n < 2:
+            return
+        v = self.value_start[x] + self.random_below(n)
+        if v == old:
+            return
+        y = -1
+        overlap = self.group_schedule[group_idx, self.values[v, 0]] & self.value_mask[v]
+        if overlap:
+            y = self.group_owner[group_idx, self.values[v, 0], highest_bit(overlap)]
+            if y == x or self.tabu_until[y] > iteration:
+                return
+            # A swap only exchanges nodes of the same length that cover exactly these slots
+            if (self.node_length[y] != self.node_length[x]
+                    or self.value_mask[self.node_value[y]] != self.value_mask[v]):
+                return
+
+        cost = self.ls_cost()
+        self.mv_len = 0
+        self.ls_set(x, -1)
+        if y != -1:
+            self.ls_set(y, -1)
+        if not self.is_consistent(x, v):
+            self.ls_revert()
+            return
+        self.ls_set(x, v)
+        if y != -1:
+            # y takes x's old slot, with any professor it can have there
+            for w in range(self.value_start[y], self.value_start[y + 1]):
+                if (self.values[w, 0] == self.values[old, 0] and self.values[w, 1] == self.values[old, 1]
+                        and self.is_consistent(y, w)):
+                    self.ls_set(y, w)
+                    break
+            if self.node_value[y] == -1:
+                self.ls_revert()
+                return
+        if not self.ls_gaps_ok():
+            self.ls_revert()
+            return
+        self.ls_accept(self.ls_cost() - cost, temperature, iteration)
+
+    cdef bint solve_local_search(self) noexcept nogil:
+        # Simulated annealing over complete-or-partial valid schedules, starting from the
+        # current (greedy) one. Cost: LS_UNASSIGNED_WEIGHT per unassigned node plus the
+        # gaps of every group. Returns True if the best schedule found assigns every node.
+        cdef long long iteration = 0
+        cdef double temperature = LS_START_TEMPERATURE
+        cdef double now, fraction
+        cdef int i
+
+        self.ls_unassigned = 0
+        for i in range(self.num_nodes):
+            if self.node_value[i] == -1:
+                self.ls_unassigned += 1
+        self.count_moved()
+        self.ls_best_cost = self.ls_cost() + 1
+        self.last_progress_time = -PROGRESS_INTERVAL
+        # The backtracking progress line is not used here
+        self.max_assigned_count = 0
+        self.last_logged_count = 0
+
+        while True:
+            if self.ls_cost() < self.ls_best_cost:
+                self.ls_best_cost = self.ls_cost()
+                for i in range(self.num_nodes):
+                    self.ls_best_value[i] = self.node_value[i]
+                now = monotonic_time()
+                if now - self.last_progress_time >= PROGRESS_INTERVAL or self.ls_best_cost == 0:
+                    self.last_progress_time = now
+                    self.log_cost(False)
+                if self.ls_best_cost == 0:
+                    break
+
+            iteration += 1
+            if (iteration & 255) == 0:
+                if self.out_of_time():
+                    break
+                fraction = (monotonic_time() - self.start_time) / self.time_limit if self.time_limit > 0 else 1.0
+                temperature = LS_START_TEMPERATURE * pow(LS_END_TEMPERATURE / LS_START_TEMPERATURE, fraction)
+
+            if self.ls_unassigned > 0 and self.random_below(2) == 0:
+                self.ls_place_move(iteration, temperature)
+            else:
+                self.ls_shift_move(iteration, temperature)
+
+        # Return to the best schedule seen
+        for i in range(self.num_nodes):
+            if self.node_value[i] != -1:
+                self.undo_move(i)
+        self.ls_unassigned = 0
+        for i in range(self.num_nodes):
+            if self.ls_best_value[i] != -1:
+                self.apply_move(i, self.ls_best_value[i])
+            else:
+                self.ls_unassigned += 1
+        self.log_cost(False)
+        return self.ls_unassigned == 0
+
+    cdef inline void lns_collect(self, int node_idx, int phase, int column, int value) noexcept nogil:
+        # Append node_idx to the search order: phase 0 takes assigned nodes whose value has
+        # values[v, column] == value (any value if column is -1), phase 1 takes unassigned ones
+        cdef int v = self.node_value[node_idx]
+        if phase == 0:
+            if v == -1 or (column != -1 and self.values[v, column] != value):
+                return
+        elif v != -1:
+            return
+        self.order[self.num_search] = node_idx
+        self.num_search += 1
+
+    cdef void log_cost(self, bint lns) noexcept with gil:
+        elapsed = monotonic_time() - self.start_time
+        label = "LNS" if lns else "Local search"
+        print(f"{label}: {self.num_nodes - self.ls_unassigned}/{self.num_nodes} assigned, {self.total_gaps} gaps - Time: {elapsed:.2f}s")
+        self.report_progress(-1)
+
+    cdef bint solve_lns(self) noexcept nogil:
+        # Large neighbourhood search from the current (greedy) schedule: free a neighbourhood
+        # (one group's day, one professor's week or every unit of a subject), re-solve it
+        # together with the unassigned nodes by backtracking for at most LNS_ITERATION_TIME,
+        # and keep the repair unless it raises the local search cost.
+        cdef double deadline = self.time_limit
+        cdef double elapsed, now
+        cdef int i, j, k, u, v, g, d, p, m, kind, phase, cost
+        cdef int num_freed = 0
+        cdef int num_unassigned, num_moved
+        cdef bint ok
+
+        self.ls_unassigned = 0
+        for i in range(self.num_nodes):
+            if self.node_value[i] == -1:
+                self.ls_unassigned += 1
+        self.count_moved()
+        self.ls_best_cost = self.ls_cost() + 1
+        self.last_progress_time = -PROGRESS_INTERVAL
+        self.quiet = True
+
+        while True:
+            cost = self.ls_cost()
+            if cost < self.ls_best_cost:
+                self.ls_best_cost = cost
+                now = monotonic_time()
+                if now - self.last_progress_time >= PROGRESS_INTERVAL or cost == 0:
+                    self.last_progress_time = now
+                    self.log_cost(True)
+            if cost == 0 or self.num_nodes == 0:
+                break
+            elapsed = monotonic_time() - self.start_time
+            if elapsed >= deadline or (self.stop_flag != NULL and self.stop_flag[0]):
+                break
+
+            # Neighbourhood around a random node and one of its candidate values: the
+            # group's day, the professor's week or the subject's units
+            u = self.random_below(self.num_nodes)
+            if self.value_start[u] == self.value_start[u + 1]:
+                continue
+            v = self.node_value[u]
+            if v == -1:
+                v = self.value_start[u] + self.random_below(self.value_start[u + 1] - self.value_start[u])
+            g = self.node_group[u]
+            d = self.values[v, 0]
+            p = self.values[v, 2]
+            m = self.node_materia[u]
+            kind = self.random_below(3)
+            # Search order: the freed nodes (shuffled), then the unassigned nodes of the
+            # neighbourhood, so the best partial repair keeps as many freed nodes as possible
+            self.num_search = 0
+            for phase in range(2):
+                if kind == 0:
+                    for k in range(self.group_nodes_start[g], self.group_nodes_start[g + 1]):
+                        self.lns_collect(self.group_nodes[k], phase, 0, d)
+                elif kind == 1:
+                    for k in range(self.prof_nodes_start[p], self.prof_nodes_start[p + 1]):
+                        self.lns_collect(self.prof_nodes[k], phase, 2, p)
+                else:
+                    for i in range(self.num_nodes):
+                        if self.node_materia[i] == m:
+                            self.lns_collect(i, phase, -1, 0)
+                if phase == 0:
+                    num_freed = self.num_search
+
+            for k in range(num_freed - 1, 0, -1):
+                j = self.random_below(k + 1)
+                i = self.order[k]
+                self.order[k] = self.order[j]
+                self.order[j] = i
+            for k in range(num_freed):
+                i = self.order[k]
+                self.lns_old_value[i] = self.node_value[i]
+                self.undo_move(i)
+
+            # Repair: a fresh backtracking run over order[:num_search]
+            self.max_assigned_count = -1
+            self.best_synced = 0
+            self.call_count = 0
+            self.time_limit_reached = False
+            self.time_limit = min(elapsed + LNS_ITERATION_TIME, deadline)
+            if not self.search_iterative():
+                self.restore_best()
+
+            # Freed nodes left out or moved elsewhere may have opened a long gap on their old day
+            ok = True
+            for k in range(num_freed):
+                i = self.order[k]
+                if has_long_gap(self.group_schedule[self.node_group[i], self.values[self.lns_old_value[i], 0]]):
+                    ok = False
+                    break
+
+            num_unassigned = self.ls_unassigned
+            num_moved = self.ls_moved
+            for k in range(self.num_search):
+                i = self.order[k]
+                if self.node_value[i] == -1:
+                    self.ls_unassigned += 1
+                if k >= num_freed:
+                    self.ls_unassigned -= 1
+                self.ls_moved += self.is_moved(i, self.node_value[i]) - self.is_moved(i, self.lns_old_value[i] if k < num_freed else -1)
+
+            if not ok or self.ls_cost() > cost:
+                # Put the neighbourhood back as it was
+                for k in range(self.num_search):
+                    i = self.order[k]
+                    if self.node_value[i] != -1:
+                        self.undo_move(i)
+                for k in range(num_freed):
+                    i = self.order[k]
+                    self.apply_move(i, self.lns_old_value[i])
+                self.ls_unassigned = num_unassigned
+                self.ls_moved = num_moved
+
+        # Leave the searcher in its default full-order state
+        for i in range(self.num_nodes):
+            self.order[i] = i
+        self.num_search = self.num_nodes
+        self.time_limit = deadline
+        self.quiet = False
+        self.log_cost(True)
+        return self.ls_unassigned == 0
+
+    cdef bint solve_greedy(self):
+        cdef int i, v
+        cdef bint assigned
         
-        for i in range(len(self.nodes)):
-            node = self.nodes[i]
-            group_idx = self.group_to_idx[node.grupo_id]
-            materia_idx = self.materia_to_idx[node.materia_id]
-            
+        for i in range(self.num_nodes):
+            if self.node_value[i] != -1:
+                continue
             assigned = False
-            for assignment in node.possible_assignments:
-                day_idx, slot_idx, prof_idx = assignment
-                
-                if self.is_valid(node, group_idx, materia_idx, day_idx, slot_idx, prof_idx):
-                    # print(f"Assigning Node {node.id} (G:{group_idx} M:{materia_idx}) to Prof {prof_idx}")
-                    self.apply_move(node, group_idx, materia_idx, day_idx, slot_idx, prof_idx)
+            for v in range(self.value_start[i], self.value_start[i + 1]):
+                if self.is_valid(i, v):
+                    # print(f"Assigning Node {i} to value {v}")
+                    self.apply_move(i, v)
                     assigned = True
                     break
             
             if not assigned:
-                # print(f"Failed to assign Node {node.id}")
+                # print(f"Failed to assign Node {i}")
                 pass
                 
         return True
 
-    cdef bint backtrack(self, int node_idx):
+    cdef inline bint is_live(self, int v) noexcept nogil:
+        return (self.dom_bits[v >> 6] >> (v & 63)) & 1
+
+    cdef void remove_value(self, int node_idx, int v) noexcept nogil:
+        self.dom_bits[v >> 6] &= ~((<UINT64_t>1) << (v & 63))
+        self.domain_size[node_idx] -= 1
+        if self.bucket_of[node_idx] != -1:
+            self.bucket_remove(node_idx)
+            self.bucket_insert(node_idx)
+        self.trail_node[self.trail_len] = node_idx
+        self.trail_value[self.trail_len] = v
+        self.trail_len += 1
+
+    cdef void restore_domains(self, int mark) noexcept nogil:
+        cdef int node_idx, v
+        while self.trail_len > mark:
+            self.trail_len -= 1
+            node_idx = self.trail_node[self.trail_len]
+            v = self.trail_value[self.trail_len]
+            self.dom_bits[v >> 6] |= (<UINT64_t>1) << (v & 63)
+            self.domain_size[node_idx] += 1
+            if self.bucket_of[node_idx] != -1:
+                self.bucket_remove(node_idx)
+                self.bucket_insert(node_idx)
+
+    cdef bint prune_node(self, int node_idx) noexcept nogil:
+        # Drop values that can no longer become valid. Returns False on wipe-out.
+        cdef int v
+        for v in range(self.value_start[node_idx], self.value_start[node_idx + 1]):
+            if not self.is_live(v):
+                continue
+            if not self.is_consistent(node_idx, v):
+                self.remove_value(node_idx, v)
+        return self.domain_size[node_idx] > 0
+
+    cdef bint prune_neighbours(self, int moved_idx) noexcept nogil:
+        # Only nodes of the same group or that can take the same professor are affected by a move
+        cdef int group_idx = self.node_group[moved_idx]
+        cdef int prof_idx = self.values[self.node_value[moved_idx], 2]
+        cdef int k, i
+        self.visit_stamp += 1
+        for k in range(self.group_nodes_start[group_idx], self.group_nodes_start[group_idx + 1]):
+            i = self.group_nodes[k]
+            if self.node_value[i] != -1 or self.visit_mark[i] == self.visit_stamp:
+                continue
+            self.visit_mark[i] = self.visit_stamp
+            if not self.prune_node(i):
+                self.wipe_node = i
+                return False
+        for k in range(self.prof_nodes_start[prof_idx], self.prof_nodes_start[prof_idx + 1]):
+            i = self.prof_nodes[k]
+            if self.node_value[i] != -1 or self.visit_mark[i] == self.visit_stamp:
+                continue
+            self.visit_mark[i] = self.visit_stamp
+            if not self.prune_node(i):
+                self.wipe_node = i
+                return False
+        return True
+
+    cdef void bucket_insert(self, int node_idx) noexcept nogil:
+        cdef int size = self.domain_size[node_idx]
+        cdef int head = self.bucket_head[size]
+        self.bucket_of[node_idx] = size
+        self.bucket_prev[node_idx] = -1
+        self.bucket_next[node_idx] = head
+        if head != -1:
+            self.bucket_prev[head] = node_idx
+        self.bucket_head[size] = node_idx
+        if size < self.bucket_min:
+            self.bucket_min = size
+
+    cdef void bucket_remove(self, int node_idx) noexcept nogil:
+        cdef int prev = self.bucket_prev[node_idx]
+        cdef int nxt = self.bucket_next[node_idx]
+        if prev != -1:
+            self.bucket_next[prev] = nxt
+        else:
+            self.bucket_head[self.bucket_of[node_idx]] = nxt
+        if nxt != -1:
+            self.bucket_prev[nxt] = prev
+        self.bucket_of[node_idx] = -1
+
+    cdef int select_mrv(self) noexcept nogil:
+        # Fail-first: fewest remaining values, ties broken by highest degree and then by
+        # the static order. Only the smallest non-empty bucket is scanned.
+        cdef int i
+        cdef int best = -1
+        while self.bucket_min < self.bucket_head.shape[0] and self.bucket_head[self.bucket_min] == -1:
+            self.bucket_min += 1
+        if self.bucket_min == self.bucket_head.shape[0]:
+            return -1
+        i = self.bucket_head[self.bucket_min]
+        while i != -1:
+            if (best == -1 or self.node_degree[i] > self.node_degree[best] or
+                    (self.node_degree[i] == self.node_degree[best] and self.order_pos[i] < self.order_pos[best])):
+                best = i
+            i = self.bucket_next[i]
+        return best
+
+    cdef void clear_conflicts(self, int depth) noexcept nogil:
+        cdef int w
+        for w in range(self.conflicts.shape[1]):
+            self.conflicts[depth, w] = 0
+        self.conflict_unsafe[depth] = 0
+
+    cdef inline void add_reason(self, int depth, int node_idx) noexcept nogil:
+        # The assignment of node_idx takes part in the conflict recorded at this depth
+        cdef int d = self.node_depth[node_idx]
+        if d == -1:
+            # Warm-started assignments are not search decisions: nothing to jump back to
+            return
+        self.conflicts[depth, d >> 6] |= (<UINT64_t>1) << (d & 63)
+
+    cdef void add_chronological(self, int depth) noexcept nogil:
+        # Fallback explanation: every earlier assignment. Such a conflict set only holds
+        # along this search path, so it is not learned.
+        cdef int w
+        for w in range(depth >> 6):
+            self.conflicts[depth, w] = ~(<UINT64_t>0)
+        if depth & 63:
+            self.conflicts[depth, depth >> 6] |= ((<UINT64_t>1) << (depth & 63)) - 1
+        self.conflict_unsafe[depth] = 1
+
+    cdef void add_earliest_reason(self, int depth, int group_idx, int materia_idx, int prof_idx) noexcept nogil:
+        # The shallowest assigned node of the group with this subject (and professor, unless -1):
+        # any one of them alone is enough to explain the conflict
+        cdef int k, i, w
+        cdef int earliest = -1
+        for k in range(self.group_nodes_start[group_idx], self.group_nodes_start[group_idx + 1]):
+            i = self.group_nodes[k]
+            w = self.node_value[i]
+            if w == -1 or self.node_materia[i] != materia_idx:
+                continue
+            if prof_idx != -1 and self.values[w, 2] != prof_idx:
+                continue
+            if earliest == -1 or self.node_depth[i] < self.node_depth[earliest]:
+                earliest = i
+        if earliest != -1:
+            self.add_reason(depth, earliest)
+
+    cdef void start_explaining(self) noexcept nogil:
+        self.explain_stamp += 1
+        self.explained_subject = False
+        self.explained_days = 0
+        self.explained_subject_days = 0
+        self.gap_days = 0
+
+    cdef bint explain_inconsistent(self, int depth, int node_idx, int v) noexcept nogil:
+        # Mirror of is_consistent: record the assignments behind the first violated rule.
+        # Returns False if the value is actually consistent. Rules whose explanation is a
+        # set of the group's nodes are only flagged here and resolved by finish_explaining().
+        cdef int group_idx = self.node_group[node_idx]
+        cdef int materia_idx = self.node_materia[node_idx]
+        cdef int day_idx = self.values[v, 0]
+        cdef int prof_idx = self.values[v, 2]
+        cdef int length = self.node_length[node_idx]
+        cdef int bit = self.value_mask[v]
+        cdef int k, i, w
+        cdef int current_prof, assigned_subject, mask
+
+        # Any one owner of an overlapping slot explains a clash
+        if self.prof_schedule[prof_idx, day_idx] & bit:
+            self.add_reason(depth, self.prof_owner[prof_idx, day_idx, highest_bit(self.prof_schedule[prof_idx, day_idx] & bit)])
+            return True
+        if self.group_schedule[group_idx, day_idx] & bit:
+            self.add_reason(depth, self.group_owner[group_idx, day_idx, highest_bit(self.group_schedule[group_idx, day_idx] & bit)])
+            return True
+        if self.prof_load[prof_idx] + length > self.prof_max_load[prof_idx]:
+            if self.explained_prof[prof_idx] != self.explain_stamp:
+                self.explained_prof[prof_idx] = self.explain_stamp
+                for k in range(self.prof_nodes_start[prof_idx], self.prof_nodes_start[prof_idx + 1]):
+                    i = self.prof_nodes[k]
+                    w = self.node_value[i]
+                    if w != -1 and self.values[w, 2] == prof_idx:
+                        self.add_reason(depth, i)
+            return True
+        current_prof = self.prof_assignment[group_idx, materia_idx]
+        if current_prof != -1 and current_prof != prof_idx:
+            if not self.explained_subject:
+                self.explained_subject = True
+                self.add_earliest_reason(depth, group_idx, materia_idx, -1)
+            return True
+        assigned_subject = self.prof_group_subject[prof_idx, group_idx]
+        if assigned_subject != -1 and assigned_subject != materia_idx:
+            self.add_earliest_reason(depth, group_idx, assigned_subject, prof_idx)
+            return True
+        if self.group_materia_day_count[group_idx, materia_idx, day_idx] > 0:
+            # Covers both the 2-hours-per-day and the contiguity rule
+            mask = self.group_materia_day_slots[group_idx, materia_idx, day_idx]
+            if self.group_materia_day_count[group_idx, materia_idx, day_idx] + length > 2 or (((mask << 1) | (mask >> 1)) & bit) == 0:
+                self.explained_subject_days |= 1 << day_idx
+                return True
+        if popcount(self.group_schedule[group_idx, day_idx]) + length > 7:
+            self.explained_days |= 1 << day_idx
+            return True
+        if self.use_symmetry:
+            k = self.sym_blocker(node_idx, v)
+            if k != -1:
+                self.add_reason(depth, k)
+                return True
+        return False
+
+    cdef void explain_gap(self, int depth, int node_idx, int v) noexcept nogil:
+        # Max-gap rule. With dynamic ordering other nodes could fill the gap before this one
+        # is tried again, so only the chronological explanation is sound.
+        cdef int day_idx = self.values[v, 0]
+        cdef unsigned int mask, holes, pairs
+        if self.use_mrv:
+            self.add_chronological(depth)
+            return
+        # With static ordering the group's earlier nodes are all assigned when this node is
+        # reached. The day's span only grows, so the long gap stays unless one of the day's
+        # nodes moves or an earlier node takes one of the gap's slots instead.
+        mask = self.group_schedule[self.node_group[node_idx], day_idx] | self.value_mask[v]
+        holes = day_span(mask) & ~mask
+        pairs = holes & (holes >> 1)
+        if not (self.gap_days >> day_idx) & 1:
+            self.gap_days |= 1 << day_idx
+            self.gap_slots[day_idx] = 0
+        self.gap_slots[day_idx] |= pairs | (pairs << 1)
+
+    cdef void finish_explaining(self, int depth, int node_idx) noexcept nogil:
+        # Resolve the flagged group rules in a single pass over the group's nodes
+        cdef int group_idx = self.node_group[node_idx]
+        cdef int materia_idx = self.node_materia[node_idx]
+        cdef int k, i, w, day_idx, d
+        cdef bint involved
+        if not (self.explained_days | self.explained_subject_days | self.gap_days):
+            return
+        for k in range(self.group_nodes_start[group_idx], self.group_nodes_start[group_idx + 1]):
+            i = self.group_nodes[k]
+            w = self.node_value[i]
+            if w == -1:
+                continue
+            day_idx = self.values[w, 0]
+            # Max hours per day / subject hours and contiguity on that day / gap on that day
+            involved = (((self.explained_days | self.gap_days) >> day_idx) & 1 or
+                        ((self.explained_subject_days >> day_idx) & 1 and self.node_materia[i] == materia_idx))
+            d = 0
+            while not involved and d < self.num_days:
+                # An earlier node that could have filled one of the gaps
+                involved = (self.gap_days >> d) & 1 and (self.node_slot_mask[i, d] & self.gap_slots[d]) != 0
+                d += 1
+            if involved:
+                self.add_reason(depth, i)
+
+    cdef void explain_exhausted(self, int depth, int node_idx) noexcept nogil:
+        # Every value of the node at this depth has failed. The assignments above are the
+        # same as when its values were tried, so the values rejected without descending are
+        # explained now; the others already merged their subtree's (or wipe-out's) conflicts.
+        cdef int v, nogood, k, w
+        self.start_explaining()
+        for v in range(self.value_start[node_idx], self.value_start[node_idx + 1]):
+            if self.explain_inconsistent(depth, node_idx, v):
+                continue
+            if has_long_gap(self.group_schedule[self.node_group[node_idx], self.values[v, 0]] | self.value_mask[v]):
+                self.explain_gap(depth, node_idx, v)
+                continue
+            if self.use_symmetry and self.prof_shadowed(self.values[v, 2]):
+                # Follows from the absence of assignments, not from specific ones
+                self.add_chronological(depth)
+                continue
+            nogood = self.find_nogood(v)
+            if nogood != -1:
+                for k in range(self.ng_start[nogood], self.ng_start[nogood + 1]):
+                    w = self.ng_lits[k]
+                    if w != v:
+                        self.add_reason(depth, self.value_node[w])
+        self.finish_explaining(depth, node_idx)
+
+    cdef void explain_wipeout(self, int depth, int wiped_idx) noexcept nogil:
+        # Forward checking emptied wiped_idx's domain: the move at this depth fails
+        # because of whatever removed each of its values, minus the move itself
+        cdef int v
+        self.start_explaining()
+        for v in range(self.value_start[wiped_idx], self.value_start[wiped_idx + 1]):
+            if not self.explain_inconsistent(depth, wiped_idx, v):
+                self.add_chronological(depth)
+        self.finish_explaining(depth, wiped_idx)
+        self.conflicts[depth, depth >> 6] &= ~((<UINT64_t>1) << (depth & 63))
+
+    cdef int backjump(self, int depth) noexcept nogil:
+        # Every value at this depth failed. Learn the conflict set as a nogood, merge it into
+        # the deepest depth it mentions and return that depth (-1 if the set is empty).
+        cdef int w
+        cdef int target = -1
+        for w in range(self.conflicts.shape[1] - 1, -1, -1):
+            if self.conflicts[depth, w]:
+                target = (w << 6) + highest_bit(self.conflicts[depth, w])
+                break
+        if target == -1:
+            return -1
+        if not self.conflict_unsafe[depth]:
+            self.learn_nogood(depth)
+        for w in range(self.conflicts.shape[1]):
+            self.conflicts[target, w] |= self.conflicts[depth, w]
+        self.conflicts[target, target >> 6] &= ~((<UINT64_t>1) << (target & 63))
+        if self.conflict_unsafe[depth]:
+            self.conflict_unsafe[target] = 1
+        return target
+
+    cdef void learn_nogood(self, int depth) noexcept nogil:
+        # Store the current values of the conflicting depths as a nogood, deepest first
+        cdef int w, d, k
+        cdef int size = 0
+        cdef UINT64_t word
+        for w in range(self.conflicts.shape[1]):
+            word = self.conflicts[depth, w]
+            while word:
+                size += 1
+                word &= word - 1
+        if size > NOGOOD_MAX_SIZE:
+            return
+        if self.ng_start[self.ng_count] + size > NOGOOD_CAPACITY:
+            self.forget_nogoods()
+        k = self.ng_start[self.ng_count]
+        for w in range(self.conflicts.shape[1] - 1, -1, -1):
+            word = self.conflicts[depth, w]
+            while word:
+                d = highest_bit(word)
+                word &= ~((<UINT64_t>1) << d)
+                self.ng_lits[k] = self.node_value[self.path[(w << 6) + d]]
+                k += 1
+        w = self.ng_lits[self.ng_start[self.ng_count]]
+        self.ng_next[self.ng_count] = self.ng_head[w]
+        self.ng_head[w] = self.ng_count
+        self.ng_count += 1
+        self.ng_start[self.ng_count] = k
+
+    cdef void forget_nogoods(self) noexcept nogil:
+        # Empty the store: the nogoods learned so far are dropped, not kept frozen
+        cdef int nogood
+        for nogood in range(self.ng_count):
+            self.ng_head[self.ng_lits[self.ng_start[nogood]]] = -1
+        self.ng_count = 0
+
+    cdef int find_nogood(self, int v) noexcept nogil:
+        # A learned nogood that assigning v would complete, or -1. Only the nogoods whose last
+        # literal is v are checked: with static ordering the other literals belong to nodes
+        # placed before v's, and with MRV a nogood met in another order is simply not used.
+        # Checking the deepest literals first rejects the ones that no longer hold early.
+        cdef int nogood = self.ng_head[v]
+        cdef int k, end, w
+        while nogood != -1:
+            end = self.ng_start[nogood + 1]
+            k = self.ng_start[nogood] + 1
+            while k < end:
+                w = self.ng_lits[k]
+                if self.node_value[self.value_node[w]] != w:
+                    break
+                k += 1
+            if k == end:
+                return nogood
+            nogood = self.ng_next[nogood]
+        return -1
+
+    cdef bint search_restarts(self) noexcept nogil:
+        # search_iterative, restarted while it stops at its dead-end limit (phase saving only)
+        cdef bint success
+        self.fail_count = 0
+        self.fail_limit = RESTART_FIRST_LIMIT
+        self.restart_requested = False
+        success = self.search_iterative()
+        while self.restart_requested and not success:
+            self.restart_requested = False
+            self.fail_count = 0
+            self.fail_limit = self.fail_limit * 3 // 2
+            success = self.search_iterative()
+        return success
+
+    cdef bint search_iterative(self) noexcept nogil:
+        # Same depth-first search as backtrack(), driven by an explicit stack
+        # (path / stack_next / stack_mark) so it can run without the GIL and
+        # without recursion. Returns True when every node is assigned.
+        cdef int depth = 0
+        cdef int node_idx, v, k, start, end, limit, phase, target
+        cdef bint descend = True
+        cdef bint placed
+
+        while True:
+            self.call_count += 1
+
+            # Check time limit every 1024 iterations
+            if (self.call_count & 1023) == 0 and self.out_of_time():
+                break
+
+            if descend:
+                # Update best solution tracking
+                if depth > self.max_assigned_count:
+                    self.snapshot_best(depth)
+
+                if depth >= self.num_search:
+                    if not self.use_bound:
+                        return True
+                    # Complete schedule: keep it as the incumbent and look for a cheaper one
+                    self.record_incumbent()
+                    if self.incumbent_cost == 0 or depth == 0:
+                        # Free of cost, or nothing to branch on (a warm start kept every node)
+                        return True
+                    depth -= 1
+                    self.pop_move(depth)
+                    descend = False
+                    continue
+
+                node_idx = self.order[depth]
+                if self.use_mrv:
+                    node_idx = self.select_mrv()
+                self.path[depth] = node_idx
+                self.stack_next[depth] = self.value_start[node_idx]
+                self.stack_phase[depth] = -1
+                if self.use_phases and self.saved_value[node_idx] != -1:
+                    # One extra position before the node's values for its saved phase
+                    self.stack_phase[depth] = self.saved_value[node_idx]
+                    self.stack_next[depth] -= 1
+                if self.use_cbj:
+                    self.clear_conflicts(depth)
+
+                if self.use_mrv and self.domain_size[node_idx] == 0:
+                    # Fail-first: nothing to try at this depth
+                    self.stack_next[depth] = self.value_limit(node_idx)
+
+            # Try the next value of the node at this depth. With the bound, stack_next runs
+            # over the values twice: first those that add no gap, then the others. A saved
+            # phase goes first, at position start - 1, and is skipped afterwards.
+            node_idx = self.path[depth]
+            start = self.value_start[node_idx]
+            end = self.value_start[node_idx + 1]
+            limit = self.value_limit(node_idx)
+            phase = self.stack_phase[depth]
+            placed = False
+            k = self.stack_next[depth]
+            while k < limit:
+                v = phase if k < start else (k if k < end else k - (end - start))
+                if ((k < start or (v != phase and (not self.use_bound or (k < end) == self.adds_no_gap(node_idx, v))))
+                        and (not self.use_domains or self.is_live(v)) and self.is_valid(node_idx, v)
+                        and (not self.use_cbj or self.find_nogood(v) == -1)):
+                    if self.push_move(depth, node_idx, v):
+                        if not self.use_bound or self.bound_total < self.incumbent_cost:
+                            placed = True
+                            break
+                        # Bound: no completion of this branch can beat the incumbent
+                        self.pop_move(depth)
+                k += 1
+            self.stack_next[depth] = k + 1
+
+            if placed:
+                depth += 1
+                descend = True
+                continue
+
+            # Values exhausted: backtrack to the previous depth and undo its move
+            if depth == 0:
+                break
+            if self.use_phases:
+                self.fail_count += 1
+                if self.fail_count >= self.fail_limit:
+                    self.restart_requested = True
+                    break
+            if self.use_cbj:
+                # Jump straight back to the deepest assignment involved in the failure
+                self.explain_exhausted(depth, node_idx)
+                target = self.backjump(depth)
+                if target == -1:
+                    # The failure does not depend on any assignment: no complete solution exists
+                    break
+                while depth > target:
+                    depth -= 1
+                    self.pop_move(depth)
+            else:
+                depth -= 1
+                self.pop_move(depth)
+            descend = False
+
+        # Aborted or exhausted: leave a clean state
+        while depth > 0:
+            depth -= 1
+            self.pop_move(depth)
+        return False
+
+    cdef bint backtrack(self, int depth):
         self.call_count += 1
         
         # Check time limit every 1000 calls
         if self.call_count % 1000 == 0:
             if self.time_limit_reached:
                  return False
-            if time.time() - self.start_time > self.time_limit:
-                print(f"Time limit reached ({self.time_limit}s). Aborting search.")
-                self.time_limit_reached = True
+            if self.out_of_time():
                 return False
             # Progress logging
-            # print(f"Backtracking at node {node_idx}/{len(self.nodes)} (Best: {self.max_assigned_count})")
+            # print(f"Backtracking at node {depth}/{self.num_nodes} (Best: {self.max_assigned_count})")
 
         # Update best solution tracking
-        if node_idx > self.max_assigned_count:
-            self.max_assigned_count = node_idx
-            # Snapshot current assignments
-            self.best_assignments = []
-            for i in range(node_idx):
-                n = <Node>self.nodes[i]
-                self.best_assignments.append((n.assigned_day, n.assigned_slot, n.assigned_prof))
-            
-            # Log progress on new best found
-            # Log progress on new best found
-            elapsed = time.time() - self.start_time
-            percentage = (node_idx / len(self.nodes)) * 100
-            last_node_info = ""
-            if node_idx > 0:
-                last_node = <Node>self.nodes[node_idx - 1]
-                prof_id = self.idx_to_prof_id[last_node.assigned_prof]
-                last_node_info = f" - Last: {last_node.grupo_id} {last_node.materia_id} -> {prof_id}"
-            
-            print(f"New best solution found: {node_idx}/{len(self.nodes)} ({percentage:.1f}%) - Time: {elapsed:.2f}s{last_node_info}")
+        if depth > self.max_assigned_count:
+            self.snapshot_best(depth)
 
-        if node_idx >= len(self.nodes):
+        if depth >= self.num_search:
             return True
             
         if self.time_limit_reached:
             return False
 
-        cdef Node node = self.nodes[node_idx]
-        cdef int group_idx = self.group_to_idx[node.grupo_id]
-        cdef int materia_idx = self.materia_to_idx[node.materia_id]
-        
-        # Optimization: Sort possible assignments?
-        # For now, iterate as provided.
+        cdef int node_idx = self.order[depth]
+        if self.use_mrv:
+            node_idx = self.select_mrv()
+            if self.domain_size[node_idx] == 0:
+                return False
+        self.path[depth] = node_idx
+
+        cdef int v
         
-        for assignment in node.possible_assignments:
+        for v in range(self.value_start[node_idx], self.value_start[node_idx + 1]):
             if self.time_limit_reached:
                 return False
-                
-            day_idx, slot_idx, prof_idx = assignment
+
+            if self.use_domains and not self.is_live(v):
+                continue
             
-            if self.is_valid(node, group_idx, materia_idx, day_idx, slot_idx, prof_idx):
+            if self.is_valid(node_idx, v):
                 # Apply
-                self.apply_move(node, group_idx, materia_idx, day_idx, slot_idx, prof_idx)
+                if not self.push_move(depth, node_idx, v):
+                    continue
                 
-                if self.backtrack(node_idx + 1):
+                if self.backtrack(depth + 1):
                     return True
                 
                 if self.time_limit_reached:
@@ -237,29 +2004,37 @@ cdef class GraphScheduler:
                     # Actually we MUST undo to keep state consistent if we want to restore best later?
                     # But restore_best overwrites everything anyway.
                     # However, undoing is safer to leave clean state.
-                    self.undo_move(node, group_idx, materia_idx, day_idx, slot_idx, prof_idx)
+                    self.pop_move(depth)
                     return False
                 
                 # Backtrack
-                self.undo_move(node, group_idx, materia_idx, day_idx, slot_idx, prof_idx)
+                self.pop_move(depth)
                 
         return False
 
-    cdef bint is_valid(self, Node node, int group_idx, int materia_idx, int day_idx, int slot_idx, int prof_idx):
+    cdef bint is_consistent(self, int node_idx, int v) noexcept nogil:
+        # Constraints that, once violated, stay violated as more moves are applied
+        # (every hard constraint except the max-gap rule). Safe for forward checking.
+        cdef int group_idx = self.node_group[node_idx]
+        cdef int materia_idx = self.node_materia[node_idx]
+        cdef int day_idx = self.values[v, 0]
+        cdef int prof_idx = self.values[v, 2]
         cdef int current_prof
         cdef int assigned_subject
         cdef int count
         cdef int mask
-        cdef int adj_mask
+        cdef int length = self.node_length[node_idx]
+        cdef int bit = self.value_mask[v]
+        cdef int day_mask = self.group_schedule[group_idx, day_idx]
 
         # 1. Prof busy
-        if self.prof_schedule[prof_idx, day_idx, slot_idx] == 1: return False
+        if self.prof_schedule[prof_idx, day_idx] & bit: return False
         
         # 2. Group busy
-        if self.group_schedule[group_idx, day_idx, slot_idx] == 1: return False
+        if day_mask & bit: return False
         
         # 3. Prof max load
-        if self.prof_load[prof_idx] >= self.prof_max_load[prof_idx]: return False
+        if self.prof_load[prof_idx] + length > self.prof_max_load[prof_idx]: return False
         
         # 4. Professor Consistency (Same subject -> Same prof)
         current_prof = self.prof_assignment[group_idx, materia_idx]
@@ -273,61 +2048,87 @@ cdef class GraphScheduler:
             return False
 
         # 5. Max 2 hours per day per subject
-        if self.group_materia_day_count[group_idx, materia_idx, day_idx] >= 2: return False
+        if self.group_materia_day_count[group_idx, materia_idx, day_idx] + length > 2: return False
         
         # 6. Contiguity (if 2nd hour)
-        # If count > 0, check if adjacent to existing slot
+        # If count > 0, the new slot must be adjacent to the existing one:
+        # shifting the subject's mask one slot each way marks the adjacent slots.
         count = self.group_materia_day_count[group_idx, materia_idx, day_idx]
         if count > 0:
-            # Check bitmask
             mask = self.group_materia_day_slots[group_idx, materia_idx, day_idx]
-            # We need to be adjacent to at least one existing slot?
-            # Or if count == 1, exactly adjacent to THAT slot.
-            # Assuming max 2 hours, count is 1.
-            # Check if (slot_idx - 1) or (slot_idx + 1) is in mask.
-            adj_mask = (1 << (slot_idx - 1)) | (1 << (slot_idx + 1))
-            if (mask & adj_mask) == 0:
+            if (((mask << 1) | (mask >> 1)) & bit) == 0:
                 return False
 
-        # 7. Max Gap <= 1 hour
-        # Check if adding this slot creates a gap > 1 with existing slots
-        cdef int s
-        cdef int last_slot = -1
-        cdef int gap
-        cdef int is_busy
-        cdef int daily_hours = 0
-        
-        for s in range(self.num_slots):
-            is_busy = 0
-            if s == slot_idx:
-                is_busy = 1
-            elif self.group_schedule[group_idx, day_idx, s] == 1:
-                is_busy = 1
-                daily_hours += 1 # Count existing hours
-            
-            if is_busy == 1:
-                if last_slot != -1:
-                    gap = s - last_slot - 1
-                    if gap > 1:
-                        return False
-                last_slot = s
-        
         # 8. Max 7 hours per day per group
-        # daily_hours already counts existing slots. 
-        # We are adding 1 new slot (slot_idx).
-        # So if existing count >= 7, we can't add more.
-        if daily_hours >= 7:
+        # The day must keep room for every hour of the node.
+        if popcount(day_mask) + length > 7:
+            return False
+
+        # 9. Symmetry breaking between interchangeable units
+        if self.use_symmetry and self.sym_blocker(node_idx, v) != -1:
+            return False
+
+        return True
+
+    cdef inline int sym_blocker(self, int node_idx, int v) noexcept nogil:
+        # The assigned chain neighbour whose key puts v out of order, or -1
+        cdef int other = self.sym_prev[node_idx]
+        if other != -1 and self.node_value[other] != -1 and self.value_key[self.node_value[other]] > self.value_key[v]:
+            return other
+        other = self.sym_next[node_idx]
+        if other != -1 and self.node_value[other] != -1 and self.value_key[self.node_value[other]] < self.value_key[v]:
+            return other
+        return -1
+
+    cdef bint is_valid(self, int node_idx, int v) noexcept nogil:
+        if not self.is_consistent(node_idx, v):
+            return False
+
+        # 7. Max Gap <= 1 hour
+        # Check if adding this slot creates a gap > 1 with existing slots.
+        # A gap can be closed by a later move, so this check is not used for pruning.
+        if has_long_gap(self.group_schedule[self.node_group[node_idx], self.values[v, 0]] | self.value_mask[v]):
+            return False
+
+        # 10. Symmetry breaking between interchangeable professors. It depends on which
+        # professors are still unused, so like the gap rule it is not used for pruning.
+        if self.use_symmetry and self.prof_shadowed(self.values[v, 2]):
             return False
 
         return True
 
-    cdef void apply_move(self, Node node, int group_idx, int materia_idx, int day_idx, int slot_idx, int prof_idx):
-        self.prof_schedule[prof_idx, day_idx, slot_idx] = 1
-        self.group_schedule[group_idx, day_idx, slot_idx] = 1
-        self.prof_load[prof_idx] += 1
+    cdef inline bint prof_shadowed(self, int prof_idx) noexcept nogil:
+        # Unused professors of a class are interchangeable: only the first of them is tried
+        if self.prof_load[prof_idx] > 0:
+            return False
+        prof_idx = self.prof_class_prev[prof_idx]
+        while prof_idx != -1:
+            if self.prof_load[prof_idx] == 0:
+                return True
+            prof_idx = self.prof_class_prev[prof_idx]
+        return False
+
+    cdef void apply_move(self, int node_idx, int v) noexcept nogil:
+        cdef int group_idx = self.node_group[node_idx]
+        cdef int materia_idx = self.node_materia[node_idx]
+        cdef int day_idx = self.values[v, 0]
+        cdef int slot_idx = self.values[v, 1]
+        cdef int prof_idx = self.values[v, 2]
+        cdef int length = self.node_length[node_idx]
+        cdef int bit = self.value_mask[v]
+        cdef int day_mask = self.group_schedule[group_idx, day_idx]
+        cdef int s
+
+        self.prof_schedule[prof_idx, day_idx] |= bit
+        self.group_schedule[group_idx, day_idx] = day_mask | bit
+        self.update_soft(group_idx, day_mask, day_mask | bit)
+        for s in range(slot_idx, slot_idx + length):
+            self.prof_owner[prof_idx, day_idx, s] = node_idx
+            self.group_owner[group_idx, day_idx, s] = node_idx
+        self.prof_load[prof_idx] += length
         
-        self.group_materia_day_count[group_idx, materia_idx, day_idx] += 1
-        self.group_materia_day_slots[group_idx, materia_idx, day_idx] |= (1 << slot_idx)
+        self.group_materia_day_count[group_idx, materia_idx, day_idx] += length
+        self.group_materia_day_slots[group_idx, materia_idx, day_idx] |= bit
         
         if self.prof_assignment_count[group_idx, materia_idx] == 0:
             self.prof_assignment[group_idx, materia_idx] = prof_idx
@@ -337,17 +2138,46 @@ cdef class GraphScheduler:
             self.prof_group_subject[prof_idx, group_idx] = materia_idx
         self.prof_group_subject_count[prof_idx, group_idx] += 1
         
-        node.assigned_day = day_idx
-        node.assigned_slot = slot_idx
-        node.assigned_prof = prof_idx
-
-    cdef void undo_move(self, Node node, int group_idx, int materia_idx, int day_idx, int slot_idx, int prof_idx):
-        self.prof_schedule[prof_idx, day_idx, slot_idx] = 0
-        self.group_schedule[group_idx, day_idx, slot_idx] = 0
-        self.prof_load[prof_idx] -= 1
+        self.node_value[node_idx] = v
+
+    cdef inline void update_soft(self, int group_idx, unsigned int old_mask, unsigned int new_mask) noexcept nogil:
+        # A move only changes one day of one group: O(1) update of the soft objective terms
+        cdef int delta = day_gaps(new_mask) - day_gaps(old_mask)
+        self.group_gaps[group_idx] += delta
+        self.total_gaps += delta
+        delta = short_day(new_mask) - short_day(old_mask)
+        self.group_short_days[group_idx] += delta
+        self.total_short_days += delta
+
+    cdef inline int soft_score(self, int group_idx) noexcept nogil:
+        return max(0, SOFT_SCORE_MAX - self.group_gaps[group_idx] - self.group_short_days[group_idx])
+
+    def group_metrics(self, int group_idx):
+        # huecos / softScore of a group and its short days as (day_idx, classes) pairs
+        cdef int d
+        short_days = []
+        for d in range(self.num_days):
+            if short_day(self.group_schedule[group_idx, d]):
+                short_days.append((d, popcount(self.group_schedule[group_idx, d])))
+        return {'huecos': self.group_gaps[group_idx], 'softScore': self.soft_score(group_idx), 'diasCortos': short_days}
+
+    cdef void undo_move(self, int node_idx) noexcept nogil:
+        cdef int v = self.node_value[node_idx]
+        cdef int group_idx = self.node_group[node_idx]
+        cdef int materia_idx = self.node_materia[node_idx]
+        cdef int day_idx = self.values[v, 0]
+        cdef int prof_idx = self.values[v, 2]
+        cdef int length = self.node_length[node_idx]
+        cdef int bit = self.value_mask[v]
+        cdef int day_mask = self.group_schedule[group_idx, day_idx]
+
+        self.prof_schedule[prof_idx, day_idx] &= ~bit
+        self.group_schedule[group_idx, day_idx] = day_mask & ~bit
+        self.update_soft(group_idx, day_mask, day_mask & ~bit)
+        self.prof_load[prof_idx] -= length
         
-        self.group_materia_day_count[group_idx, materia_idx, day_idx] -= 1
-        self.group_materia_day_slots[group_idx, materia_idx, day_idx] &= ~(1 << slot_idx)
+        self.group_materia_day_count[group_idx, materia_idx, day_idx] -= length
+        self.group_materia_day_slots[group_idx, materia_idx, day_idx] &= ~bit
         
         self.prof_assignment_count[group_idx, materia_idx] -= 1
         if self.prof_assignment_count[group_idx, materia_idx] == 0:
@@ -357,31 +2187,272 @@ cdef class GraphScheduler:
         if self.prof_group_subject_count[prof_idx, group_idx] == 0:
             self.prof_group_subject[prof_idx, group_idx] = -1
         
-        node.assigned_day = -1
-        node.assigned_slot = -1
-        node.assigned_prof = -1
+        self.node_value[node_idx] = -1
+
+def assignment_dict(Node node, prof_id, int day_idx, int slot_idx):
+    # One entry of run_scheduler's 'assignments'
+    return {
+        'id': node.id,
+        'grupoId': node.grupo_id,
+        'materiaId': node.materia_id,
+        'profesorId': prof_id,
+        'dia': ['mon', 'tue', 'wed', 'thu', 'fri'][day_idx],
+        'slotId': f"s{slot_idx + 1}",
+        'duracion': node.length
+    }
+
+def pack_domains(nodes_data):
+    """Packs every node's possibleAssignments into one contiguous int32 array.
+
+    Returns (values, value_start) where values[value_start[i]:value_start[i + 1]]
+    holds the (day_idx, slot_idx, prof_idx) rows of node i. The rows may be lists of
+    tuples or (n, 3) arrays, as built by preprocess.build_nodes.
+    """
+    rows = [n['possibleAssignments'] for n in nodes_data]
+    value_start = np.zeros(len(rows) + 1, dtype=np.int32)
+    np.cumsum([len(r) for r in rows], out=value_start[1:])
+    total = int(value_start[len(rows)])
+    if rows and all(isinstance(r, np.ndarray) for r in rows):
+        values = np.concatenate([r.reshape(-1, 3) for r in rows]).astype(np.int32)
+    else:
+        values = np.fromiter(chain.from_iterable(chain.from_iterable(rows)), dtype=np.int32, count=3 * total).reshape(total, 3)
+    return values, value_start
+
+def initial_values(nodes_data, values, value_start):
+    """Maps each node's previousAssignment (day_idx, slot_idx, prof_idx) to its value row.
+
+    Returns an int32 array with -1 for nodes without one, or whose previous placement is no
+    longer among their candidates (e.g. the professor is not available there any more).
+    """
+    initial = np.full(len(nodes_data), -1, dtype=np.int32)
+    for i, n in enumerate(nodes_data):
+        previous = n.get('previousAssignment')
+        if previous is None:
+            continue
+        hits = np.flatnonzero((values[value_start[i]:value_start[i + 1]] == previous).all(axis=1))
+        if len(hits):
+            initial[i] = value_start[i] + hits[0]
+    return initial
+
+def shuffle_domains(values, value_start, seed):
+    """Returns a copy of values with the rows of every node in a random order.
+
+    Each node keeps its value_start[i]:value_start[i + 1] slice, so value_start is unchanged.
+    """
+    rng = np.random.default_rng(seed)
+    owner = np.repeat(np.arange(len(value_start) - 1), np.diff(value_start))
+    return np.ascontiguousarray(values[np.lexsort((rng.random(len(values)), owner))])
+
+# Search settings cycled through by the portfolio workers. Worker i runs
+# PORTFOLIO_CONFIGS[i % len(PORTFOLIO_CONFIGS)]; every worker but the first also
+# shuffles its value order with seed i, so worker 0 is the plain deterministic search.
+PORTFOLIO_CONFIGS = [
+    {'ordering': 'static', 'forward_checking': False, 'backjumping': False},
+    {'ordering': 'static', 'forward_checking': True, 'backjumping': False},
+    {'ordering': 'static', 'forward_checking': True, 'backjumping': True},
+    {'ordering': 'mrv', 'forward_checking': True, 'backjumping': False},
+]
+
+# Stop flag and progress queue of the worker processes (portfolio and components), set by
+# the pool initializer: shared memory and queues can only reach a spawned process when it starts
+_worker_stop = None
+_worker_progress = None
+
+def _init_worker(stop_flag, progress_queue=None):
+    global _worker_stop, _worker_progress
+    _worker_stop = stop_flag
+    _worker_progress = progress_queue
+
+def _worker_reporter(key):
+    # Progress callback of a worker process: sends (key, event) to the parent's queue
+    if _worker_progress is None:
+        return None
+    return lambda event: _worker_progress.put((key, event))
+
+def _drain_progress(progress_queue, latest):
+    # Moves the queued worker events into latest ({key: last event}); True if any arrived
+    received = False
+    while True:
+        try:
+            key, event = progress_queue.get_nowait()
+        except Empty:
+            return received
+        latest[key] = event
+        received = True
+
+def _portfolio_worker(nodes_data, profesores, grupos, materias, deadline, worker, progress_schedule):
+    config = PORTFOLIO_CONFIGS[worker % len(PORTFOLIO_CONFIGS)]
+    print(f"Portfolio worker {worker}: {config}, seed {worker}")
+    # Already one process per worker: decomposing here would start a pool inside each of them
+    return run_scheduler(nodes_data, profesores, grupos, materias, 'backtracking', round(max(0.0, deadline - time.time()), 2),
+                         seed=worker, stop_flag=_worker_stop, decompose=False, progress=_worker_reporter(worker),
+                         progress_schedule=progress_schedule, **config)
+
+def run_portfolio(nodes_data, profesores, grupos, materias, time_limit=300, workers=None, stop_flag=None, progress=None, progress_schedule=False):
+    """Runs differently configured and seeded backtracking searches in parallel processes.
+
+    All workers share the time limit. The first complete schedule stops the others;
+    otherwise the partial result with the most assignments is returned. progress receives
+    the event of the worker with the most assignments so far.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.time()
+    deadline = start + time_limit
+    # spawn: forking a threaded server process could copy held locks into the workers
+    context = multiprocessing.get_context('spawn')
+    if stop_flag is None:
+        stop_flag = context.RawValue('i', 0)
+    progress_queue = None if progress is None else context.Queue()
+    latest = {}
+    print(f"Starting portfolio with {workers} workers and time limit: {time_limit}s")
+
+    best = None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(stop_flag, progress_queue)) as pool:
+        pending = {pool.submit(_portfolio_worker, nodes_data, profesores, grupos, materias, deadline, i, progress_schedule)
+                   for i in range(workers)}
+        while pending:
+            done, pending = wait(pending, timeout=None if progress is None else PROGRESS_INTERVAL,
+                                 return_when=FIRST_COMPLETED)
+            if progress is not None and _drain_progress(progress_queue, latest):
+                event = dict(max(latest.values(), key=lambda e: e['asignados']))
+                event['tiempoMs'] = int((time.time() - start) * 1000)
+                progress(event)
+            for future in done:
+                result = future.result()
+                if best is None or (not best['success'] and
+                                    (result['success'] or len(result['assignments']) > len(best['assignments']))):
+                    best = result
+                if result['success']:
+                    stop_flag.value = 1
+    return best
+
+def find_components(nodes_data):
+    """Splits the nodes into independent subproblems.
+
+    Two nodes interact only through their group or a professor they can both take, so the
+    connected components of the group-professor graph can be solved separately. Returns
+    lists of node indices, in node order.
+    """
+    parent = {}
+
+    def find(key):
+        parent.setdefault(key, key)
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for n in nodes_data:
+        root = find(('g', n['grupoId']))
+        for p in set(np.asarray(n['possibleAssignments'], dtype=np.int32).reshape(-1, 3)[:, 2].tolist()):
+            parent[find(('p', p))] = root
+
+    components = {}
+    for i, n in enumerate(nodes_data):
+        components.setdefault(find(('g', n['grupoId'])), []).append(i)
+    return list(components.values())
+
+def _component_worker(nodes_data, profesores, grupos, materias, time_limit, key, options):
+    return run_scheduler(nodes_data, profesores, grupos, materias, time_limit=time_limit,
+                         stop_flag=_worker_stop, decompose=False, progress=_worker_reporter(key), **options)
+
+def _merge_component_progress(latest, total, start):
+    # One event for the whole problem from the last event of each component
+    events = list(latest.values())
+    costs = [e['costo'] for e in events]
+    event = {
+        'asignados': sum(e['asignados'] for e in events),
+        'total': total,
+        'tiempoMs': int((time.time() - start) * 1000),
+        'nodosExplorados': sum(e['nodosExplorados'] for e in events),
+        'costo': None if None in costs else sum(costs)
+    }
+    if events and 'asignaciones' in events[0]:
+        event['asignaciones'] = list(chain.from_iterable(e['asignaciones'] for e in events))
+    return event
+
+def run_components(components, nodes_data, profesores, grupos, materias, time_limit=300, workers=None, stop_flag=None, progress=None, **options):
+    """Solves each component with its own scheduler in parallel processes and merges the
+    assignments. Succeeds only if every component does. progress receives the sum of the
+    components' last events."""
+    workers = min(workers or os.cpu_count() or 1, len(components))
+    start = time.time()
+    deadline = start + time_limit
+    context = multiprocessing.get_context('spawn')
+    progress_queue = None if progress is None else context.Queue()
+    latest = {}
+    print(f"Solving {len(components)} independent components with {workers} workers")
+
+    # Smallest components first; each one gets its share of the remaining time, so the time
+    # left over by easy components goes to the larger ones
+    queue = sorted(components, key=len)
+    results = []
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(stop_flag, progress_queue)) as pool:
+        while queue or pending:
+            while queue and len(pending) < workers:
+                rounds = (len(queue) + workers - 1) // workers
+                budget = round(max(0.0, deadline - time.time()) / rounds, 2)
+                component = queue.pop(0)
+                pending.add(pool.submit(_component_worker, [nodes_data[i] for i in component], profesores,
+                                        grupos, materias, budget, component[0], options))
+            done, pending = wait(pending, timeout=None if progress is None else PROGRESS_INTERVAL,
+                                 return_when=FIRST_COMPLETED)
+            if progress is not None and _drain_progress(progress_queue, latest):
+                progress(_merge_component_progress(latest, len(nodes_data), start))
+            results.extend(future.result() for future in done)
+
+    order = {n['id']: i for i, n in enumerate(nodes_data)}
+    assignments = sorted(chain.from_iterable(r['assignments'] for r in results), key=lambda a: order[a['id']])
+    # Components share no group, so their metrics never overlap
+    metrics = {}
+    for r in results:
+        metrics.update(r['metrics'])
+    return {'success': all(r['success'] for r in results), 'assignments': assignments, 'metrics': metrics}
+
+def run_scheduler(nodes_data, profesores, grupos, materias, algorithm='backtracking', time_limit=300, ordering='static', forward_checking=False, engine='iterative', backjumping=False, workers=None, seed=0, stop_flag=None, symmetry=True, decompose=True, phase_saving=False, progress=None, progress_schedule=False):
+    # progress(event) is called with each progress line: 'asignados' of 'total' nodes, 'tiempoMs',
+    # 'nodosExplorados' (backtracking steps), 'costo' and, with progress_schedule, 'asignaciones'
+    if algorithm == 'portfolio':
+        return run_portfolio(nodes_data, profesores, grupos, materias, time_limit, workers, stop_flag, progress, progress_schedule)
+    if decompose and algorithm != 'greedy':
+        # The greedy is linear and would give the same result on each component
+        components = find_components(nodes_data)
+        if len(components) > 1:
+            return run_components(components, nodes_data, profesores, grupos, materias, time_limit, workers, stop_flag,
+                                  algorithm=algorithm, ordering=ordering, forward_checking=forward_checking,
+                                  engine=engine, backjumping=backjumping, seed=seed, symmetry=symmetry,
+                                  phase_saving=phase_saving, progress=progress, progress_schedule=progress_schedule)
 
-def run_scheduler(nodes_data, profesores, grupos, materias, algorithm='backtracking', time_limit=300):
     # Prepare data
+    values, value_start = pack_domains(nodes_data)
+    if seed:
+        values = shuffle_domains(values, value_start, seed)
     nodes = []
-    for n in nodes_data:
-        node = Node(n['id'], n['grupoId'], n['materiaId'], n['unitIndex'])
-        node.possible_assignments = n['possibleAssignments']
+    for i, n in enumerate(nodes_data):
+        node = Node(n['id'], n['grupoId'], n['materiaId'], n['unitIndex'], n.get('duracion', 1))
+        node.value_start = value_start[i]
+        node.value_end = value_start[i + 1]
         nodes.append(node)
         
-    scheduler = GraphScheduler(nodes, 5, 9, profesores, grupos, materias) # 5 days, 9 slots
-    success = scheduler.solve(algorithm, time_limit)
+    scheduler = GraphScheduler(nodes, values, value_start, 5, 9, profesores, grupos, materias) # 5 days, 9 slots
+    scheduler.set_stop_flag(stop_flag)
+    scheduler.set_progress(progress, progress_schedule)
+    scheduler.set_initial(initial_values(nodes_data, values, value_start))
+    success = scheduler.solve(algorithm, time_limit, ordering, forward_checking, engine, backjumping, seed, symmetry, phase_saving)
     
     result = []
     for node in nodes:
         if node.assigned_day != -1:
-            result.append({
-                'id': node.id,
-                'grupoId': node.grupo_id,
-                'materiaId': node.materia_id,
-                'profesorId': scheduler.idx_to_prof_id[node.assigned_prof],
-                'dia': ['mon', 'tue', 'wed', 'thu', 'fri'][node.assigned_day],
-                'slotId': f"s{node.assigned_slot + 1}" if node.assigned_slot < 4 else f"s{node.assigned_slot + 1}"
-            })
+            result.append(assignment_dict(node, scheduler.idx_to_prof_id[node.assigned_prof],
+                                          node.assigned_day, node.assigned_slot))
+
+    # Soft objective per group with nodes in this (sub)problem, read from the solver state
+    metrics = {}
+    for node in nodes:
+        if node.grupo_id not in metrics:
+            metrics[node.grupo_id] = scheduler.group_metrics(scheduler.group_to_idx[node.grupo_id])
             
-    return {'success': success, 'assignments': result}
+    return {'success': success, 'assignments': result, 'metrics': metrics}
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import preprocess
+
+
+def professor(prof_id, competencias, blocked=(), max_horas=20):
+    # Available everywhere except the (day_id, slot_id) pairs in blocked
+    return {
+        'id': prof_id,
+        'nombre': prof_id,
+        'competencias': list(competencias),
+        'maxHoras': max_horas,
+        'disponibilidad': {day_id: {slot_id: 'blocked' if (day_id, slot_id) in blocked else 'available'
+                                    for slot_id in preprocess.SLOT_IDS}
+                           for day_id in preprocess.DAY_IDS}
+    }
+
+
+@pytest.fixture
+def small_payload():
+    # Two groups of one cuatrimestre sharing three professors
+    return {
+        'profesores': [
+            professor('P1', ['MAT', 'FIS'], blocked={('mon', 's1'), ('tue', 's3')}),
+            professor('P2', ['MAT', 'PRO']),
+            professor('P3', ['FIS', 'PRO'], blocked={('fri', 's9')}),
+        ],
+        'grupos': [
+            {'id': 'G1', 'nombre': 'G1', 'cuatrimestre': 1, 'turno': 'matutino'},
+            {'id': 'G2', 'nombre': 'G2', 'cuatrimestre': 1, 'turno': 'matutino'},
+        ],
+        'planDeEstudios': [
+            {'id': 'MAT', 'nombre': 'MAT', 'cuatrimestre': 1, 'horasSemana': 4},
+            {'id': 'FIS', 'nombre': 'FIS', 'cuatrimestre': 1, 'horasSemana': 3},
+            {'id': 'PRO', 'nombre': 'PRO', 'cuatrimestre': 1, 'horasSemana': 3},
+        ]
+    }
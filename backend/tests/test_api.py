@@ -0,0 +1,18 @@
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('options', [
+    {'timeLimit': None},
+    {'timeLimit': 'abc'},
+    {'ordering': 'random'},
+    {'backjumping': True, 'engine': 'recursive'},
+    {'backjumping': True, 'algorithm': 'optimize'},
+    {'phaseSaving': True, 'engine': 'recursive'},
+    {'nodeModel': 'pairs'},
+])
+def test_invalid_options_are_rejected(small_payload, options):
+    response = app.app.test_client().post('/api/solve', json={**small_payload, **options})
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
@@ -0,0 +1,35 @@
+import contextlib
+import io
+import random
+
+import pytest
+
+import scheduler
+
+
+def random_instance(seed):
+    # Small groups of units with sparse random domains: many have no complete schedule
+    r = random.Random(seed)
+    profesores = [{'id': f'p{i}', 'maxHoras': r.randint(2, 8)} for i in range(r.randint(2, 4))]
+    grupos = [{'id': f'g{i}'} for i in range(r.randint(1, 3))]
+    materias = [{'id': f'm{i}'} for i in range(r.randint(2, 4))]
+    nodes = []
+    for grupo in grupos:
+        for materia in materias:
+            profs = r.sample(range(len(profesores)), r.randint(1, len(profesores)))
+            for unit in range(r.randint(1, 4)):
+                values = [[d, s, p] for d in range(5) for s in range(9) for p in profs if r.random() < 0.08]
+                r.shuffle(values)
+                nodes.append({'id': f'n{len(nodes)}', 'grupoId': grupo['id'], 'materiaId': materia['id'],
+                              'unitIndex': unit, 'possibleAssignments': values})
+    return nodes, profesores, grupos, materias
+
+
+@pytest.mark.parametrize('options', [{}, {'forward_checking': True}, {'ordering': 'mrv', 'forward_checking': True}])
+def test_backjumping_agrees_with_backtracking(options):
+    for seed in range(40):
+        instance = random_instance(seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            plain = scheduler.run_scheduler(*instance, time_limit=5, decompose=False, **options)
+            jumping = scheduler.run_scheduler(*instance, time_limit=5, decompose=False, backjumping=True, **options)
+        assert jumping['success'] == plain['success'], seed
@@ -0,0 +1,44 @@
+import pytest
+
+import app
+import preprocess
+from conftest import professor
+
+
+def solve(payload, **options):
+    response = app.app.test_client().post('/api/solve', json={**payload, 'timeLimit': 5, 'useCache': False,
+                                                              'nodeModel': 'blocks', **options})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 'ok'
+    return {b['id']: b for h in body['horarios'] for b in h['bloques']}
+
+
+def paired(bloques, first, second):
+    a, b = bloques[first], bloques[second]
+    return (a['dia'] == b['dia'] and a['profesorId'] == b['profesorId']
+            and abs(preprocess.SLOT_IDS.index(a['slotId']) - preprocess.SLOT_IDS.index(b['slotId'])) == 1)
+
+
+@pytest.mark.parametrize('algorithm', ['backtracking', 'optimize', 'lns'])
+def test_blocks_are_kept_together(small_payload, algorithm):
+    bloques = solve(small_payload, algorithm=algorithm)
+    assert len(bloques) == 20
+    for grupo in ('G1', 'G2'):
+        assert paired(bloques, f'{grupo}-MAT-0', f'{grupo}-MAT-1')
+        assert paired(bloques, f'{grupo}-MAT-2', f'{grupo}-MAT-3')
+        assert paired(bloques, f'{grupo}-FIS-0', f'{grupo}-FIS-1')
+
+
+def test_block_that_does_not_fit_is_split():
+    # No two consecutive free hours on any day: the block can only be given hour by hour
+    blocked = {(day_id, slot_id) for day_id in preprocess.DAY_IDS for slot_id in preprocess.SLOT_IDS
+               if slot_id != 's1'}
+    payload = {
+        'profesores': [professor('P1', ['MAT'], blocked=blocked)],
+        'grupos': [{'id': 'G1', 'nombre': 'G1', 'cuatrimestre': 1, 'turno': 'matutino'}],
+        'planDeEstudios': [{'id': 'MAT', 'nombre': 'MAT', 'cuatrimestre': 1, 'horasSemana': 2}],
+    }
+    bloques = solve(payload)
+    assert set(bloques) == {'G1-MAT-0', 'G1-MAT-1'}
+    assert not paired(bloques, 'G1-MAT-0', 'G1-MAT-1')
@@ -0,0 +1,65 @@
+import os
+
+import app
+from cache import ResultCache, payload_key
+
+
+def test_key_ignores_dict_order_but_not_list_order():
+    assert payload_key({'a': 1, 'b': {'x': 1, 'y': 2}}) == payload_key({'b': {'y': 2, 'x': 1}, 'a': 1})
+    assert payload_key({'a': [1, 2]}) != payload_key({'a': [2, 1]})
+    assert payload_key({'a': 1}, 'v1') != payload_key({'a': 1}, 'v2')
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2, directory=None)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['desalojos'] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('cache.time.time', lambda: now[0])
+    cache = ResultCache(ttl=10, directory=None)
+    cache.put('a', 1)
+    now[0] += 5
+    assert cache.get('a') == 1
+    now[0] += 6
+    assert cache.get('a') is None
+
+
+def test_disk_store_is_shared_and_expires(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('cache.time.time', lambda: now[0])
+    ResultCache(ttl=10, directory=str(tmp_path)).put('a', {'status': 'ok'})
+    # A new process only has the disk store
+    other = ResultCache(ttl=10, directory=str(tmp_path))
+    assert other.get('a') == {'status': 'ok'}
+    assert other.stats()['aciertosDisco'] == 1
+    now[0] += 11
+    assert ResultCache(ttl=10, directory=str(tmp_path)).get('a') is None
+    assert not os.path.exists(tmp_path / 'a.json')
+
+
+def test_disk_store_drops_oldest_files(tmp_path):
+    cache = ResultCache(directory=str(tmp_path), max_disk_entries=2)
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, i)
+        os.utime(tmp_path / f'{key}.json', (i, i))
+    cache.prune_disk()
+    assert sorted(os.listdir(tmp_path)) == ['b.json', 'c.json']
+
+
+def test_use_cache_false_neither_reads_nor_writes(small_payload, monkeypatch):
+    monkeypatch.setattr(app, 'results', ResultCache(directory=None))
+    client = app.app.test_client()
+    client.post('/api/solve', json={**small_payload, 'timeLimit': 5, 'useCache': False})
+    assert app.results.stats()['entradas'] == 0
+    client.post('/api/solve', json={**small_payload, 'timeLimit': 5})
+    client.post('/api/solve', json={**small_payload, 'timeLimit': 5})
+    assert app.results.stats()['aciertos'] == 1
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from jobs import CANCELLED, JobManager, SharedJob
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def wait_finished(manager, job_id):
+    wait_until(lambda: manager.get(job_id).finished is not None)
+    return manager.get(job_id)
+
+
+class FakeSolve:
+    """Stands in for solve_payload: reports one progress event, then runs until released
+    or stopped, and answers with the payload it got."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = []
+
+    def __call__(self, payload, stop_flag, progress):
+        self.started.append(payload)
+        progress({'asignados': 1, 'total': 2, 'asignaciones': [{'id': 'x'}]})
+        while not self.release.is_set() and not stop_flag.value:
+            time.sleep(0.01)
+        return {'status': 'ok', 'payload': payload, 'stop': stop_flag.value}, 200
+
+
+@pytest.fixture
+def solve():
+    fake = FakeSolve()
+    yield fake
+    fake.release.set()
+
+
+def test_submit_runs_the_solve(solve):
+    manager = JobManager(solve, max_workers=1, directory=None)
+    job = manager.submit({'n': 1})
+    wait_until(lambda: job.status == 'running' and job.progress is not None)
+    state = job.to_dict()
+    assert 'asignaciones' not in state['progreso']
+    assert job.to_dict(True)['progreso']['asignaciones'] == [{'id': 'x'}]
+    solve.release.set()
+    job = wait_finished(manager, job.id)
+    assert job.status == 'done'
+    assert job.to_dict()['resultado'] == {'status': 'ok', 'payload': {'n': 1}, 'stop': 0}
+
+
+def test_error_status(solve):
+    manager = JobManager(lambda payload, stop_flag, progress: ({'status': 'error'}, 500), directory=None)
+    assert wait_finished(manager, manager.submit({}).id).status == 'error'
+
+
+def test_cancel_while_queued_never_runs(solve):
+    manager = JobManager(solve, max_workers=1, directory=None)
+    first = manager.submit({'n': 1})
+    second = manager.submit({'n': 2})
+    wait_until(lambda: first.status == 'running')
+    manager.cancel(second.id)
+    assert second.status == 'cancelled'
+    solve.release.set()
+    wait_finished(manager, first.id)
+    assert solve.started == [{'n': 1}]
+
+
+def test_cancel_while_running_keeps_the_partial_result(solve):
+    manager = JobManager(solve, max_workers=1, directory=None)
+    job = manager.submit({'n': 1})
+    wait_until(lambda: job.status == 'running')
+    manager.cancel(job.id)
+    job = wait_finished(manager, job.id)
+    assert job.status == 'cancelled'
+    assert job.result['stop'] == CANCELLED
+
+
+def test_unknown_job(solve):
+    manager = JobManager(solve, directory=None)
+    assert manager.get('0' * 32) is None
+    assert manager.cancel('0' * 32) is None
+
+
+def test_finished_jobs_are_purged_after_ttl(solve):
+    solve.release.set()
+    manager = JobManager(solve, max_workers=1, ttl=0.3, directory=None)
+    old = manager.submit({'n': 1})
+    wait_finished(manager, old.id)
+    manager.submit({'n': 2})
+    assert manager.get(old.id) is not None
+    time.sleep(0.4)
+    manager.submit({'n': 3})
+    assert manager.get(old.id) is None
+
+
+def test_shared_directory_cancel_marker(solve, tmp_path):
+    # Two server processes sharing SOLVER_JOBS_DIR: the job lives in owner
+    owner = JobManager(solve, max_workers=1, directory=str(tmp_path))
+    other = JobManager(solve, max_workers=1, directory=str(tmp_path))
+    job = owner.submit({'n': 1})
+    wait_until(lambda: job.status == 'running')
+
+    shared = other.get(job.id)
+    assert isinstance(shared, SharedJob)
+    assert shared.status == 'running'
+    other.cancel(job.id)
+    assert (tmp_path / f'{job.id}.cancel').exists()
+
+    # The owner's watcher picks the marker up, and the other process sees the outcome
+    wait_until(lambda: job.finished is not None)
+    assert job.status == 'cancelled'
+    assert not (tmp_path / f'{job.id}.cancel').exists()
+    wait_until(lambda: other.get(job.id).status == 'cancelled')
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import preprocess
+from conftest import professor
+
+
+def reference_nodes(profesores, grupos, plan_de_estudios, node_model='units'):
+    # The per-unit loops build_nodes replaced: every unit scans its days, slots and
+    # rotated eligible professors one by one
+    nodes_data = []
+    materia_global_idx = 0
+    for grupo in grupos:
+        for materia in [m for m in plan_de_estudios if m['cuatrimestre'] == grupo['cuatrimestre']]:
+            materia_global_idx += 1
+            start_day_idx = materia_global_idx % 5
+            day_order = preprocess.DAY_IDS[start_day_idx:] + preprocess.DAY_IDS[:start_day_idx]
+            if node_model == 'blocks':
+                durations = [2] * (materia['horasSemana'] // 2) + [1] * (materia['horasSemana'] % 2)
+            else:
+                durations = [1] * materia['horasSemana']
+            first_unit = 0
+            for i, duracion in enumerate(durations):
+                eligible = [p_idx for p_idx, p in enumerate(profesores) if materia['id'] in p['competencias']]
+                if eligible:
+                    start = (materia_global_idx + i) % len(eligible)
+                    eligible = eligible[start:] + eligible[:start]
+                possible = []
+                for day_id in day_order:
+                    for slot_idx in range(len(preprocess.SLOT_IDS) - duracion + 1):
+                        for p_idx in eligible:
+                            day = profesores[p_idx]['disponibilidad'].get(day_id, {})
+                            if all(day.get(preprocess.SLOT_IDS[slot_idx + h]) == 'available' for h in range(duracion)):
+                                possible.append((preprocess.DAY_IDS.index(day_id), slot_idx, p_idx))
+                nodes_data.append({
+                    'id': f"{grupo['id']}-{materia['id']}-{first_unit}",
+                    'grupoId': grupo['id'],
+                    'materiaId': materia['id'],
+                    'unitIndex': i,
+                    'duracion': duracion,
+                    'possibleAssignments': possible
+                })
+                first_unit += duracion
+    return nodes_data
+
+
+@pytest.fixture
+def mixed_payload(small_payload):
+    payload = small_payload
+    payload['profesores'].append(professor('P4', ['MAT', 'MAT', 'QUI'], blocked={('wed', 's5'), ('thu', 's1')}))
+    # Slots neither available nor blocked, and a day missing altogether
+    payload['profesores'][1]['disponibilidad']['mon']['s2'] = 'blank'
+    del payload['profesores'][2]['disponibilidad']['thu']
+    payload['grupos'].append({'id': 'G3', 'nombre': 'G3', 'cuatrimestre': 2, 'turno': 'vespertino'})
+    payload['planDeEstudios'] += [
+        # Nobody teaches HIS; MAT appears twice more, once in the same cuatrimestre
+        {'id': 'HIS', 'nombre': 'HIS', 'cuatrimestre': 1, 'horasSemana': 2},
+        {'id': 'MAT', 'nombre': 'MAT (taller)', 'cuatrimestre': 1, 'horasSemana': 3},
+        {'id': 'MAT', 'nombre': 'MAT II', 'cuatrimestre': 2, 'horasSemana': 5},
+        {'id': 'QUI', 'nombre': 'QUI', 'cuatrimestre': 2, 'horasSemana': 3},
+    ]
+    return payload
+
+
+@pytest.mark.parametrize('node_model', ['units', 'blocks'])
+def test_build_nodes_matches_per_unit_loops(mixed_payload, node_model):
+    args = (mixed_payload['profesores'], mixed_payload['grupos'], mixed_payload['planDeEstudios'], node_model)
+    nodes = preprocess.build_nodes(*args)
+    expected = reference_nodes(*args)
+    assert [{k: v for k, v in n.items() if k != 'possibleAssignments'} for n in nodes] == \
+           [{k: v for k, v in n.items() if k != 'possibleAssignments'} for n in expected]
+    for node, ref in zip(nodes, expected):
+        rows = np.asarray(node['possibleAssignments'])
+        assert rows.dtype == np.int32
+        assert [tuple(r) for r in rows.tolist()] == ref['possibleAssignments'], node['id']
+    # The fixture exercises the edge cases
+    assert any(not n['possibleAssignments'] for n in expected)
+    assert len({n['id'] for n in nodes}) < len(nodes)
@@ -0,0 +1,17 @@
+import app
+
+
+def test_optimize_with_every_node_kept(small_payload, capsys):
+    # Every previous assignment is still valid, so nothing is left to search
+    client = app.app.test_client()
+    first = client.post('/api/solve', json={**small_payload, 'timeLimit': 5, 'useCache': False}).get_json()
+    assert first['status'] == 'ok'
+
+    response = client.post('/api/solve', json={**small_payload, 'timeLimit': 5, 'useCache': False,
+                                               'algorithm': 'optimize', 'horariosPrevios': first['horarios']})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 'ok'
+    assert sum(len(h['bloques']) for h in body['horarios']) == 20
+    # Optimal only with the kept assignments fixed
+    assert 'optimal with 20 warm-start assignments kept fixed' in capsys.readouterr().out
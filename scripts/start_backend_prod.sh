@@ -0,0 +1,4 @@
+#!/bin/bash
+# Production server: pre-forked gunicorn workers (settings in backend/gunicorn.conf.py)
+cd "$(dirname "$0")/../backend"
+./venv/bin/gunicorn -c gunicorn.conf.py app:app